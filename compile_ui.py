@@ -0,0 +1,71 @@
+"""Compiles the designer files in the ui folder into Python form classes, so the GUI doesn't parse XML for every dialog
+
+Run "python compile_ui.py" from the folder with the ui folder in it after changing any .ui file. The GUI checks each
+compiled form against the .ui file it was made from and loads the .ui file itself when they don't match or nothing
+has been compiled, so a missing or out of date compile only costs speed.
+"""
+from os import path, mkdir
+import glob
+import hashlib
+import io
+import re
+
+# the folder the designer files are in and the package their compiled forms are written to
+UI_FOLDER = 'ui'
+FORMS_PACKAGE = 'ui_forms'
+
+def ui_digest(ui_path: str) -> str:
+    """Fingerprints a designer file so a compiled form can be matched to the version it was made from
+
+    Args:
+        ui_path (str): The path to the .ui file
+
+    Returns:
+        str: The hex SHA-256 of the file
+    """
+    with open(ui_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def compile_form(ui_path: str, module_path: str) -> None:
+    """Compiles one designer file into a module whose form class is always called Form
+
+    Args:
+        ui_path (str): The path to the .ui file
+        module_path (str): The path to write the module to
+    """
+    from PyQt6 import uic
+
+    # compiling into memory first so a failed compile doesn't leave half a module behind
+    code = io.StringIO()
+    with open(ui_path, encoding='utf-8') as source:
+        uic.compileUi(source, code)
+    code = code.getvalue()
+
+    # naming the form class the same in every module, since designer calls most of the top level widgets Dialog
+    form_class = re.search(r'^class (\w+)\(', code, re.MULTILINE).group(1)
+    with open(module_path, 'w', encoding='utf-8') as module:
+        module.write(code)
+        module.write(f'\n\nForm = {form_class}\n')
+
+def main() -> None:
+    """Compiles every designer file in the ui folder and records which version of each the package was made from
+    """
+    if not path.isdir(FORMS_PACKAGE):
+        mkdir(FORMS_PACKAGE)
+
+    sources: dict = {}
+    for ui_path in sorted(glob.glob(path.join(UI_FOLDER, '*.ui'))):
+        name = path.splitext(path.basename(ui_path))[0]
+        compile_form(ui_path, path.join(FORMS_PACKAGE, name + '.py'))
+        sources[name] = ui_digest(ui_path)
+
+    # writing the fingerprints last, so forms from an interrupted run never look up to date
+    with open(path.join(FORMS_PACKAGE, '__init__.py'), 'w', encoding='utf-8') as package:
+        package.write('"""Form classes compiled from the ui folder by compile_ui.py, do not edit by hand"""\n\n')
+        package.write('# the fingerprint of the .ui file each form was compiled from\n')
+        package.write(f'SOURCES = {sources!r}\n')
+
+    print(f"Compiled {len(sources)} forms into {FORMS_PACKAGE}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""A long running agent that keeps the vault unlocked and serves it to the CLI and GUI over a local socket
+
+Start it with "python pw_agent.py" and every pw_manager or pw_gui run from the same folder will use it instead of
+unwrapping the keys and indexing the vault again, so lookups take milliseconds instead of a full cold start.
+"""
+from typing import List, Tuple
+import json
+import os
+import socket
+import socketserver
+import sys
+import pw_manager
+import pw_search
+
+# where the agent listens, which can be moved with the PWM_AGENT_SOCK environment variable
+AGENT_SOCKET = os.environ.get('PWM_AGENT_SOCK', os.path.join(os.getcwd(), 'config', 'agent.sock'))
+
+# the vault operations the agent serves, by the name clients ask for them with
+OPERATIONS = {
+    'get_pass': pw_manager.get_pass,
+    'check_sites': pw_manager.check_sites,
+    'save_pass': pw_manager.save_pass,
+    'delete_pass': pw_manager.delete_pass,
+    'save_many': pw_manager.save_many,
+    'list_accounts': pw_manager.list_accounts,
+    'search': pw_search.search,
+}
+
+class AgentError(Exception):
+    """Raised when the agent can't be reached or fails a request for a reason other than missing site data"""
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    """Answers the requests on one client connection, one JSON object per line in each direction"""
+
+    def handle(self):
+        """Reads requests until the client hangs up and writes back the result or error for each one
+        """
+        # only serving the user the agent is running as, where the system can tell us who connected
+        if hasattr(socket, 'SO_PEERCRED'):
+            import struct
+            credentials = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            pid, uid, gid = struct.unpack('3i', credentials)
+            if uid != os.getuid():
+                return
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'ping':
+                    response = {'ok': True, 'result': os.getpid()}
+                elif op == 'lock':
+                    pw_manager.session.lock()
+                    response = {'ok': True, 'result': None}
+                elif op == 'shutdown':
+                    self.wfile.write(json.dumps({'ok': True, 'result': None}).encode('utf-8') + b'\n')
+                    self.server.stop()
+                    return
+                elif op not in OPERATIONS:
+                    # answering before dispatching, so a bad op is never mistaken for a site with no data
+                    response = {'ok': False, 'error': 'AgentError', 'message': f"unknown operation {op!r}"}
+                else:
+                    response = {'ok': True, 'result': OPERATIONS[op](*request.get('args', []))}
+            except KeyError as error:
+                response = {'ok': False, 'error': 'KeyError', 'message': str(error.args[0]) if error.args else ''}
+            except Exception as error:
+                response = {'ok': False, 'error': type(error).__name__, 'message': str(error)}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """The socket server that hands each client connection to its own thread"""
+    daemon_threads = True
+
+    def stop(self):
+        """Stops serving from a handler thread without waiting on itself
+        """
+        import threading
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+class AgentClient:
+    """Talks to a running agent, with the same functions as pw_manager so callers can use either one
+
+    Args:
+        socket_path (str, optional): Where the agent is listening. Defaults to AGENT_SOCKET.
+    """
+    def __init__(self, socket_path: str = AGENT_SOCKET):
+        self.socket_path = socket_path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile('rwb')
+
+    def call(self, op: str, *args):
+        """Sends one request to the agent and waits for its answer
+
+        Args:
+            op (str): The name of the operation to run
+            *args: The arguments to pass to the operation
+
+        Returns:
+            Any: Whatever the operation returned
+        """
+        self._file.write(json.dumps({'op': op, 'args': list(args)}).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise AgentError("the agent closed the connection")
+
+        response = json.loads(line)
+        if response['ok']:
+            return response['result']
+        if response['error'] == 'KeyError':
+            raise KeyError(response['message'])
+        raise AgentError(f"{response['error']}: {response['message']}")
+
+    def get_pass(self, site: str, username: str = None) -> Tuple[str, str, str]:
+        """Getter to retrieve user data for a given website through the agent"""
+        return tuple(self.call('get_pass', site, username))
+
+    def list_accounts(self, site: str, start: str = None, stop: str = None) -> List[Tuple[str, str, str]]:
+        """Gets every account saved on a website, or the accounts with usernames in a range, through the agent"""
+        return [tuple(account) for account in self.call('list_accounts', site, start, stop)]
+
+    def check_sites(self, site: str) -> Tuple[str, str]:
+        """Checks to see if a saved password and username exists for the given website through the agent"""
+        return tuple(self.call('check_sites', site))
+
+    def save_pass(self, site: str, username: str, password: str) -> None:
+        """Saves the username and password for a website through the agent"""
+        self.call('save_pass', site, username, password)
+
+    def delete_pass(self, site: str, username: str = None) -> None:
+        """Deletes the user data for a given website through the agent"""
+        self.call('delete_pass', site, username)
+
+    def save_many(self, entries, deletions=()) -> int:
+        """Saves and deletes the data for many websites in one commit through the agent"""
+        deletions = [site if isinstance(site, str) else list(site) for site in deletions]
+        return self.call('save_many', [list(entry) for entry in entries], deletions)
+
+    def search(self, query: str, limit: int = pw_search.SEARCH_LIMIT) -> List[Tuple[str, str]]:
+        """Finds the saved sites matching what the user has typed so far through the agent"""
+        return [tuple(match) for match in self.call('search', query, limit)]
+
+    def close(self) -> None:
+        """Hangs up on the agent
+        """
+        self._file.close()
+        self._socket.close()
+
+def connect(socket_path: str = AGENT_SOCKET) -> AgentClient:
+    """Connects to the agent if one is running
+
+    Args:
+        socket_path (str, optional): Where the agent is listening. Defaults to AGENT_SOCKET.
+
+    Returns:
+        AgentClient: A client for the running agent, or None if there isn't one
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    try:
+        return AgentClient(socket_path)
+    except OSError:
+        return None
+
+def serve(socket_path: str = AGENT_SOCKET, timeout: float = None) -> None:
+    """Unlocks the vault and serves it on a local socket until the agent is stopped
+
+    Args:
+        socket_path (str, optional): Where to listen. Defaults to AGENT_SOCKET.
+        timeout (float, optional): Idle seconds before the agent locks the keys again. Defaults to SESSION_TIMEOUT.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise AgentError("this system doesn't support local sockets, so the agent can't run here")
+
+    # clearing away a socket left behind by an agent that didn't shut down cleanly
+    if os.path.exists(socket_path):
+        if connect(socket_path) is not None:
+            raise AgentError(f"an agent is already running on {socket_path}")
+        os.remove(socket_path)
+
+    # unwrapping the keys and indexing the vault now so the first request is already fast
+    pw_manager.initializer()
+    if timeout is not None:
+        pw_manager.session.timeout = timeout
+    with pw_manager.vault_lock.shared():
+        pw_manager.index.refresh()
+    pw_manager.session.fernet()
+
+    # making sure only this user can connect to the socket
+    old_umask = os.umask(0o177)
+    try:
+        server = AgentServer(socket_path, AgentHandler)
+    finally:
+        os.umask(old_umask)
+
+    print(f"Password Manager agent listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pw_manager.session.lock()
+        pw_manager.writer.sync()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def main() -> None:
+    """Starts the agent, or stops the running one with "python pw_agent.py stop"
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == 'stop':
+        client = connect()
+        if client is None:
+            print("No agent is running")
+        else:
+            client.call('shutdown')
+            print("Agent stopped")
+        return
+
+    timeout = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    serve(timeout=timeout)
+
+if __name__ == '__main__':
+    main()
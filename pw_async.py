@@ -0,0 +1,212 @@
+"""An asyncio interface to the vault for automation that looks up or saves many credentials at once
+
+Every call runs the file access and cryptography in an executor so the event loop is never blocked, lookups made
+while the loop is busy are answered together from one snapshot of the vault, and saves made close together are
+committed together:
+
+    async with AsyncVault() as vault:
+        site, username, password = await vault.get("example.com")
+        await vault.save_many([("example.org", "me", "hunter2")])
+"""
+from typing import List, Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pw_manager
+
+class AsyncVault:
+    """Awaitable versions of the pw_manager vault functions, with the same site name standardization
+
+    Args:
+        executor (Executor, optional): Where the blocking work runs. Defaults to a small thread pool of our own.
+    """
+    def __init__(self, executor=None):
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix='pw_async')
+
+        # lookups and saves waiting for the next time the event loop is free, keyed so repeats share one result
+        self._lookups: dict = {}
+        self._saves: dict = {}
+        self._lookup_scheduled = False
+        self._save_scheduled = False
+
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def initialize(self) -> None:
+        """Makes sure the vault files and keys exist, like pw_manager.initializer
+        """
+        await self._run(pw_manager.initializer)
+
+    async def close(self) -> None:
+        """Waits for any saves that haven't been committed yet and shuts down our thread pool
+        """
+        # letting scheduled batches start, then waiting on everything still pending
+        await asyncio.sleep(0)
+        pending = [future for site, future in self._lookups.values()] + [future for entry, future in self._saves.values()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._run(pw_manager.writer.sync)
+
+        # waiting for our threads to finish from the loop's default executor, since joining them here would block the loop
+        if self._own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+
+    async def get(self, site: str, username: str = None) -> Tuple[str, str, str]:
+        """Getter to retrieve user data for a given website
+
+        Args:
+            site (str): The name of the website thats data we want to retrieve
+            username (str, optional): The account to retrieve. Defaults to None for the account saved most recently.
+
+        Returns:
+            Tuple[str, str, str]: The website name, username, and password for the given website
+        """
+        result = await self._lookup(site, username)
+        if result is None:
+            site_name = pw_manager.site_key(site)
+            raise KeyError(site_name if username is None else f"{username} on {site_name}")
+        return result
+
+    async def check(self, site: str) -> Tuple[str, str]:
+        """Checks to see if a saved password and username exists for the given website
+
+        Args:
+            site (str): The user-given name of the website
+
+        Returns:
+            Tuple[str, str]: Outputs either a 1 if data exists and a username, or a -1 if data does not exist
+        """
+        result = await self._lookup(site)
+        if result is None:
+            return -1, None
+        return 1, result[1]
+
+    async def save(self, site: str, username: str, password: str) -> None:
+        """Saves the username and password for a website, committed together with any other saves made meanwhile
+
+        Args:
+            site (str): The name of the website the user data belongs to
+            username (str): The entered username for the specified website
+            password (str): The password to save for the website
+        """
+        loop = asyncio.get_running_loop()
+        account = (pw_manager.site_key(site), username)
+
+        # a newer save for the same account replaces the waiting one, and both callers wait on the same commit
+        if account in self._saves:
+            future = self._saves[account][1]
+        else:
+            future = loop.create_future()
+        self._saves[account] = ((site, username, password), future)
+
+        if not self._save_scheduled:
+            self._save_scheduled = True
+            loop.call_soon(self._commit_saves)
+        await asyncio.shield(future)
+
+    async def save_many(self, entries, deletions=()) -> int:
+        """Saves and deletes the data for many websites in one commit
+
+        Args:
+            entries (Iterable[Tuple[str, str, str]]): The site, username and password for each website to save
+            deletions (Iterable, optional): The names of websites whose accounts should all be deleted, or (site, username) pairs for single accounts. Defaults to ().
+
+        Returns:
+            int: The number of accounts or sites that were saved or deleted
+        """
+        return await self._run(pw_manager.save_many, list(entries), list(deletions))
+
+    async def delete(self, site: str, username: str = None) -> None:
+        """Deletes the user data for a given website
+
+        Args:
+            site (str): The name of the website whose data is to be deleted
+            username (str, optional): The account to delete. Defaults to None to delete every account on the site.
+        """
+        await self._run(pw_manager.delete_pass, site, username)
+
+    async def list_accounts(self, site: str, start: str = None, stop: str = None) -> List[Tuple[str, str, str]]:
+        """Gets every account saved on a website, or the accounts with usernames in a range
+
+        Args:
+            site (str): The name of the website whose accounts we want
+            start (str, optional): The first username to include. Defaults to None to start from the first one.
+            stop (str, optional): The username to stop before. Defaults to None to go to the last one.
+
+        Returns:
+            List[Tuple[str, str, str]]: The website name, username, and password of each account, sorted by username
+        """
+        return await self._run(pw_manager.list_accounts, site, start, stop)
+
+    async def _run(self, function, *args):
+        """Runs a blocking vault function in the executor
+
+        Args:
+            function (Callable): The function to run
+            *args: The arguments to pass to it
+
+        Returns:
+            Any: Whatever the function returned
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _lookup(self, site: str, username: str = None) -> Tuple[str, str, str]:
+        """Queues a lookup to be answered with every other lookup made before the event loop is next free
+
+        Args:
+            site (str): The name of the website to look up
+            username (str, optional): The account to look up. Defaults to None for the account saved most recently.
+
+        Returns:
+            Tuple[str, str, str]: The website name, username, and password, or None if there is no data
+        """
+        loop = asyncio.get_running_loop()
+        account = (pw_manager.site_key(site), username)
+
+        # lookups of the same account share one result
+        if account not in self._lookups:
+            self._lookups[account] = (site if username is None else (site, username), loop.create_future())
+            if not self._lookup_scheduled:
+                self._lookup_scheduled = True
+                loop.call_soon(self._answer_lookups)
+        return await asyncio.shield(self._lookups[account][1])
+
+    def _answer_lookups(self) -> None:
+        """Sends every waiting lookup to the executor as one snapshot read
+        """
+        lookups, self._lookups = self._lookups, {}
+        self._lookup_scheduled = False
+        sites = [site for site, future in lookups.values()]
+
+        def finish(job: asyncio.Future) -> None:
+            for site, future in lookups.values():
+                if future.done():
+                    continue
+                if job.exception() is not None:
+                    future.set_exception(job.exception())
+                else:
+                    future.set_result(job.result()[site])
+
+        asyncio.ensure_future(self._run(pw_manager.get_many, sites)).add_done_callback(finish)
+
+    def _commit_saves(self) -> None:
+        """Sends every waiting save to the executor as one batch commit
+        """
+        saves, self._saves = self._saves, {}
+        self._save_scheduled = False
+        entries = [entry for entry, future in saves.values()]
+
+        def finish(job: asyncio.Future) -> None:
+            for entry, future in saves.values():
+                if future.done():
+                    continue
+                if job.exception() is not None:
+                    future.set_exception(job.exception())
+                else:
+                    future.set_result(None)
+
+        asyncio.ensure_future(self._run(pw_manager.save_many, entries)).add_done_callback(finish)
@@ -0,0 +1,406 @@
+"""Times the vault operations on synthetic vaults of growing size and saves the results as JSON
+
+    python pw_bench.py --sizes 10,1000,100000 --output bench.json
+    python pw_bench.py --compare old.json bench.json
+
+Every vault is built in its own temporary folder, so the real vault is never touched, and nothing uses the network
+or the GUI. Warm timings repeat an operation in one process that already has the keys unwrapped and the vault
+indexed, like the agent or the GUI. Cold timings start a new process for every call, like a CLI run, so they include
+importing pw_manager, unwrapping the keys and opening the index. The operating system's file cache is left as it is,
+so cold means a cold process rather than a cold disk.
+"""
+from typing import List
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# vault sizes benchmarked unless others are asked for, up to 1000000 can be given with --sizes
+DEFAULT_SIZES = (10, 1000, 100000)
+
+# the operations that can be benchmarked, in the order they run
+OPERATIONS = ('get_pass', 'check_sites', 'save_pass', 'delete_pass', 'new_pass', 'newKeys')
+
+# how many times each operation is timed in a warm process and how many new processes time it cold
+WARM_REPEATS = 200
+COLD_REPEATS = 5
+
+# how many accounts the synthetic vault is built with per commit
+BUILD_CHUNK = 10000
+
+# the seed for picking which sites to look up, so runs against different versions do the same work
+SEED = 1
+
+def _site(number: int) -> str:
+    """Makes the name of one of the synthetic sites
+
+    Args:
+        number (int): Which site
+
+    Returns:
+        str: The website name
+    """
+    return f"www.site{number}.com"
+
+def _io_counters() -> dict:
+    """Reads how many bytes this process has read and written through system calls, where the system reports it
+
+    Returns:
+        dict: The bytes read and written so far, or None if the system doesn't say
+    """
+    try:
+        with open('/proc/self/io') as file:
+            counters = dict(line.split(': ') for line in file.read().splitlines())
+    except OSError:
+        return None
+    return {"read": int(counters['rchar']), "written": int(counters['wchar'])}
+
+def _usage() -> dict:
+    """Reads the peak memory use and page faults of this process, where the system reports them
+
+    Returns:
+        dict: The peak resident set size in bytes and the page faults so far, or None if the system doesn't say
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # macOS reports the peak in bytes, everything else in kilobytes
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {"peak_rss": usage.ru_maxrss * scale, "faults": usage.ru_minflt + usage.ru_majflt}
+
+def _percentile(ordered: List[float], share: float) -> float:
+    """Finds a percentile of some latencies with the nearest rank method
+
+    Args:
+        ordered (List[float]): The latencies, sorted
+        share (float): The percentile, like 99 for the 99th
+
+    Returns:
+        float: The latency at that percentile
+    """
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(share / 100 * len(ordered)) - 1))]
+
+def _summarize(latencies: List[float], io_before: dict, io_after: dict, usage_before: dict, usage_after: dict) -> dict:
+    """Turns the latencies and counters of a run of calls into the numbers saved in the results
+
+    Args:
+        latencies (List[float]): The seconds each call took
+        io_before (dict): _io_counters from before the first call
+        io_after (dict): _io_counters from after the last call
+        usage_before (dict): _usage from before the first call
+        usage_after (dict): _usage from after the last call
+
+    Returns:
+        dict: The call count, throughput, latency percentiles in milliseconds, and I/O and page faults per call
+    """
+    calls = len(latencies)
+    total = sum(latencies)
+    ordered = sorted(latencies)
+    summary = {
+        "calls": calls,
+        "seconds": total,
+        "ops_per_sec": calls / total if total else None,
+        "p50_ms": _percentile(ordered, 50) * 1000,
+        "p99_ms": _percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "bytes_read": None,
+        "bytes_written": None,
+        "page_faults": None,
+    }
+
+    # the log is read through a memory map, which doesn't count as bytes read, so page faults are kept beside them
+    if io_before is not None and io_after is not None:
+        summary["bytes_read"] = (io_after["read"] - io_before["read"]) / calls
+        summary["bytes_written"] = (io_after["written"] - io_before["written"]) / calls
+    if usage_before is not None and usage_after is not None:
+        summary["page_faults"] = (usage_after["faults"] - usage_before["faults"]) / calls
+    return summary
+
+def _merge(runs: List[dict]) -> dict:
+    """Combines the summaries of several single call runs, like the cold calls made in separate processes
+
+    Args:
+        runs (List[dict]): The summaries of each run
+
+    Returns:
+        dict: One summary over every call
+    """
+    latencies = sorted(run["seconds"] for run in runs)
+    total = sum(latencies)
+    merged = {
+        "calls": len(runs),
+        "seconds": total,
+        "ops_per_sec": len(runs) / total if total else None,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+    for field in ("peak_rss_bytes", "bytes_read", "bytes_written", "page_faults", "import_ms", "open_ms"):
+        values = [run[field] for run in runs if run.get(field) is not None]
+        merged[field] = max(values) if field == "peak_rss_bytes" and values else (sum(values) / len(values) if values else None)
+    return merged
+
+def _call(pw_manager, op: str, size: int, rng: random.Random, counter: list):
+    """Makes one call of an operation, after doing any setup it needs that shouldn't be timed
+
+    Args:
+        pw_manager (module): The vault module
+        op (str): The name of the operation
+        size (int): The number of sites in the vault
+        rng (random.Random): Picks which sites to use
+        counter (list): A one item list counting the sites saved so far, so every save adds a new one
+
+    Returns:
+        Callable[[], None]: The call to time
+    """
+    if op == 'get_pass':
+        site = _site(rng.randrange(size))
+        return lambda: pw_manager.get_pass(site)
+    elif op == 'check_sites':
+        # half of the checks are for sites that were never saved
+        site = _site(rng.randrange(size * 2))
+        return lambda: pw_manager.check_sites(site)
+    elif op == 'new_pass':
+        return lambda: pw_manager.new_pass(16)
+    elif op == 'newKeys':
+        return pw_manager.newKeys
+
+    counter[0] += 1
+    site = f"new{counter[0]}-{os.getpid()}.com"
+    if op == 'save_pass':
+        return lambda: pw_manager.save_pass(site, "bench", "bench-password")
+
+    # saving the site first so every deletion has something to delete
+    pw_manager.save_pass(site, "bench", "bench-password")
+    return lambda: pw_manager.delete_pass(site)
+
+def build_vault(size: int) -> dict:
+    """Builds a vault of synthetic sites in the current folder, committing a chunk of sites at a time
+
+    Args:
+        size (int): The number of sites to save
+
+    Returns:
+        dict: How long the build took and how big the vault file ended up
+    """
+    import pw_manager
+
+    start = time.perf_counter()
+    pw_manager.initializer()
+    for first in range(0, size, BUILD_CHUNK):
+        pw_manager.save_many((_site(number), f"user{number}", f"password-{number:08d}") for number in range(first, min(first + BUILD_CHUNK, size)))
+    pw_manager.writer.sync()
+    return {"build_seconds": time.perf_counter() - start, "vault_bytes": os.path.getsize(pw_manager.record_log)}
+
+def warm(size: int, ops: List[str], repeats: int) -> dict:
+    """Times each operation repeatedly in this process, after unwrapping the keys and indexing the vault
+
+    Args:
+        size (int): The number of sites in the vault
+        ops (List[str]): The operations to time
+        repeats (int): How many calls to time for each operation
+
+    Returns:
+        dict: The summary for each operation, and the peak memory use of the whole run, since the operating system
+        only reports the peak of the process so far rather than what each operation used
+    """
+    import pw_manager
+
+    pw_manager.initializer()
+    pw_manager.session.fernet()
+    with pw_manager.vault_lock.shared():
+        pw_manager.index.refresh()
+
+    rng = random.Random(SEED)
+    counter = [0]
+    results: dict = {}
+    for op in ops:
+        # changing the keys rewrites the whole vault, so once tells us enough
+        calls = 1 if op == 'newKeys' else repeats
+        latencies = []
+        io_before, usage_before = _io_counters(), _usage()
+        for _ in range(calls):
+            call = _call(pw_manager, op, size, rng, counter)
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+
+        # saves are made durable in the background, which is part of their cost
+        start = time.perf_counter()
+        pw_manager.writer.sync()
+        latencies[-1] += time.perf_counter() - start
+        results[op] = _summarize(latencies, io_before, _io_counters(), usage_before, _usage())
+
+    usage = _usage()
+    return {"ops": results, "peak_rss_bytes": usage["peak_rss"] if usage is not None else None}
+
+def cold(size: int, op: str) -> dict:
+    """Times one call of an operation in this new process, including importing and opening the vault
+
+    Args:
+        size (int): The number of sites in the vault
+        op (str): The operation to time
+
+    Returns:
+        dict: The summary of the call, with how long importing and opening the vault took and the peak memory use of
+        the process that made it
+    """
+    io_before, usage_before = _io_counters(), _usage()
+    start = time.perf_counter()
+    import pw_manager
+    imported = time.perf_counter()
+
+    # unwrapping the keys up front, which the call would do anyway, so a deletion's untimed save can't do it instead
+    pw_manager.initializer()
+    pw_manager.session.fernet()
+    opened = time.perf_counter()
+
+    call = _call(pw_manager, op, size, random.Random(SEED + os.getpid()), [0])
+    called = time.perf_counter()
+    call()
+    pw_manager.writer.sync()
+    elapsed = (opened - start) + (time.perf_counter() - called)
+
+    summary = _summarize([elapsed], io_before, _io_counters(), usage_before, _usage())
+    summary["import_ms"] = (imported - start) * 1000
+    summary["open_ms"] = (opened - start) * 1000
+    usage = _usage()
+    summary["peak_rss_bytes"] = usage["peak_rss"] if usage is not None else None
+    return summary
+
+def _run_child(args: List[str], folder: str) -> dict:
+    """Runs this script in a new process in a vault folder and reads back the JSON it prints
+
+    Args:
+        args (List[str]): The arguments for the child
+        folder (str): The folder the vault is in
+
+    Returns:
+        dict: Whatever the child printed
+    """
+    output = subprocess.run([sys.executable, os.path.abspath(__file__)] + args, cwd=folder, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run(sizes: List[int], ops: List[str], warm_repeats: int = WARM_REPEATS, cold_repeats: int = COLD_REPEATS) -> dict:
+    """Builds a vault of each size and times every operation on it, warm and cold
+
+    Args:
+        sizes (List[int]): The numbers of sites to build vaults with
+        ops (List[str]): The operations to time
+        warm_repeats (int, optional): How many calls to time in the warm process. Defaults to WARM_REPEATS.
+        cold_repeats (int, optional): How many new processes to time each call in. Defaults to COLD_REPEATS.
+
+    Returns:
+        dict: The results, with details of the machine and version they were measured on
+    """
+    import platform
+
+    results = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "warm_repeats": warm_repeats,
+        "cold_repeats": cold_repeats,
+        "sizes": {},
+    }
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix='pw_bench') as folder:
+            print(f"Building a vault of {size} sites", file=sys.stderr)
+            result = _run_child(['--build', str(size)], folder)
+
+            # the cold calls run first, since the warm run changes the keys at the end
+            cold_ops = [op for op in ops if op != 'newKeys']
+            print(f"Timing {size} sites cold", file=sys.stderr)
+            cold_results = {op: _merge([_run_child(['--cold', op, str(size)], folder) for _ in range(cold_repeats)]) for op in cold_ops}
+            print(f"Timing {size} sites warm", file=sys.stderr)
+            warm_results = _run_child(['--warm', ','.join(ops), str(size), str(warm_repeats)], folder)
+
+            result["warm_peak_rss_bytes"] = warm_results["peak_rss_bytes"]
+            result["ops"] = {op: {"warm": warm_results["ops"][op], "cold": cold_results.get(op)} for op in ops}
+            results["sizes"][str(size)] = result
+    return results
+
+def _version() -> str:
+    """Finds which commit of the password manager is being measured, if it is in a git checkout
+
+    Returns:
+        str: The commit hash, or None if git can't tell us
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_path: str, new_path: str) -> None:
+    """Prints how the median and 99th percentile latency of every operation changed between two result files
+
+    Args:
+        old_path (str): The results to compare against
+        new_path (str): The newer results
+    """
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+
+    print(f"{'size':>8} {'operation':<12} {'mode':<5} {'p50 ms':>20} {'p99 ms':>20}")
+    for size, result in new["sizes"].items():
+        for op, modes in result["ops"].items():
+            for mode, summary in modes.items():
+                before = old["sizes"].get(size, {}).get("ops", {}).get(op, {}).get(mode)
+                if summary is None or before is None:
+                    continue
+                columns = []
+                for field in ("p50_ms", "p99_ms"):
+                    change = summary[field] / before[field] if before[field] else float('nan')
+                    columns.append(f"{before[field]:.3f} > {summary[field]:.3f} {change:.2f}x")
+                print(f"{size:>8} {op:<12} {mode:<5} {columns[0]:>20} {columns[1]:>20}")
+
+def main() -> None:
+    """Runs the benchmarks from the command line, or one of the child processes they start
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the password manager on synthetic vaults")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help="comma separated vault sizes")
+    parser.add_argument('--ops', default=','.join(OPERATIONS), help="comma separated operations to time")
+    parser.add_argument('--repeats', type=int, default=WARM_REPEATS, help="warm calls to time for each operation")
+    parser.add_argument('--cold-repeats', type=int, default=COLD_REPEATS, help="new processes to time each operation in")
+    parser.add_argument('--output', default='bench.json', help="where to save the results")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files instead of running")
+
+    # the child processes the benchmark starts in each vault folder
+    parser.add_argument('--build', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--warm', nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument('--cold', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.build is not None:
+        print(json.dumps(build_vault(args.build)))
+    elif args.warm is not None:
+        ops, size, repeats = args.warm
+        print(json.dumps(warm(int(size), ops.split(','), int(repeats))))
+    elif args.cold is not None:
+        op, size = args.cold
+        print(json.dumps(cold(int(size), op)))
+    elif args.compare is not None:
+        compare(*args.compare)
+    else:
+        ops = [op for op in args.ops.split(',') if op]
+        unknown = set(ops) - set(OPERATIONS)
+        if unknown:
+            parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+        results = run([int(size) for size in args.sizes.split(',')], ops, args.repeats, args.cold_repeats)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved the results to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
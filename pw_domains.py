@@ -0,0 +1,157 @@
+"""Turns whatever the user typed for a website into the one key its data is saved under
+
+The key is the registrable domain, the part of the host name someone actually registered, found with the public
+suffix rules: "accounts.google.co.uk" and "www.google.co.uk" both become "google.co.uk", while "google.com" stays
+separate. Anything that isn't a host name, like an IP address or a single word, is kept as it is.
+"""
+import functools
+
+# the public suffixes with more than one label, from the public suffix list (publicsuffix.org). A name with none
+# of these is treated as having just its last label as the suffix, which is what the list does for any top level
+# domain, so single label suffixes like "com" or "de" don't need listing. "*" matches any one label and a leading
+# "!" marks an exception to a wildcard.
+PUBLIC_SUFFIXES = """
+ac.uk co.uk gov.uk ltd.uk me.uk net.uk nhs.uk org.uk plc.uk police.uk sch.uk
+asn.au com.au edu.au gov.au id.au net.au org.au
+co.nz geek.nz gen.nz govt.nz net.nz org.nz school.nz
+ac.jp ad.jp co.jp ed.jp go.jp gr.jp lg.jp ne.jp or.jp
+ac.kr co.kr go.kr ne.kr or.kr re.kr
+com.cn edu.cn gov.cn net.cn org.cn
+com.hk edu.hk gov.hk net.hk org.hk
+com.tw edu.tw gov.tw net.tw org.tw
+com.sg edu.sg gov.sg net.sg org.sg
+com.my edu.my gov.my net.my org.my
+co.id go.id or.id web.id
+com.ph edu.ph gov.ph net.ph org.ph
+ac.in co.in edu.in firm.in gen.in gov.in ind.in net.in org.in
+com.pk edu.pk gov.pk net.pk org.pk
+ac.il co.il gov.il net.il org.il
+com.tr edu.tr gov.tr net.tr org.tr
+ac.za co.za edu.za gov.za net.za org.za
+com.ng edu.ng gov.ng net.ng org.ng
+co.ke go.ke or.ke
+com.eg edu.eg gov.eg
+com.sa edu.sa gov.sa net.sa org.sa
+com.br edu.br gov.br net.br org.br
+com.ar edu.ar gob.ar gov.ar net.ar org.ar
+com.mx edu.mx gob.mx net.mx org.mx
+com.co edu.co gov.co net.co org.co
+com.pe edu.pe gob.pe net.pe org.pe
+co.ve com.ve
+com.ua edu.ua gov.ua net.ua org.ua
+com.pl net.pl org.pl
+co.at or.at
+com.es edu.es gob.es nom.es org.es
+com.pt edu.pt gov.pt org.pt
+com.gr edu.gr gov.gr net.gr org.gr
+com.ru net.ru org.ru
+*.ck !www.ck
+*.bd
+*.np
+appspot.com blogspot.com cloudfront.net herokuapp.com azurewebsites.net elasticbeanstalk.com
+github.io gitlab.io netlify.app pages.dev vercel.app workers.dev firebaseapp.com web.app
+"""
+
+def _compile_suffixes(rules: str) -> dict:
+    """Builds the suffix trie, keyed by labels from the right so a host name is matched by walking its labels backwards
+
+    Args:
+        rules (str): The public suffix rules, separated by whitespace
+
+    Returns:
+        dict: The root of the trie, where each node maps a label to the next node and '' marks the end of a rule
+    """
+    trie: dict = {}
+    for rule in rules.split():
+        # an exception rule keeps its "!" on the label, so it sits beside the wildcard it is an exception to
+        node = trie
+        for label in reversed(rule.split('.')):
+            node = node.setdefault(label, {})
+        node[''] = True
+    return trie
+
+@functools.lru_cache(maxsize=None)
+def _suffix_trie() -> dict:
+    """Gets the public suffix rules as a trie, compiling them the first time a site is standardized
+
+    Returns:
+        dict: The root of the suffix trie
+    """
+    return _compile_suffixes(PUBLIC_SUFFIXES)
+
+def _suffix_length(labels: list) -> int:
+    """Finds how many labels at the end of a host name are its public suffix, using the longest matching rule
+
+    Args:
+        labels (list): The labels of the host name, left to right
+
+    Returns:
+        int: The number of labels in the public suffix
+    """
+    # any top level domain is a public suffix, even one the rules don't list
+    length = 1
+    node = _suffix_trie()
+    for depth, label in enumerate(reversed(labels), start=1):
+        # an exception makes this label the registrable part, so the suffix is everything after it
+        if '!' + label in node:
+            return depth - 1
+
+        wildcard = node.get('*')
+        if wildcard is not None and '' in wildcard:
+            length = depth
+        child = node.get(label)
+        if child is not None and '' in child:
+            length = depth
+
+        node = child if child is not None else wildcard
+        if node is None:
+            break
+    return length
+
+def host_name(site: str) -> str:
+    """Pulls the host name out of a website name, which may be a full link with a scheme, port, path or login
+
+    Args:
+        site (str): The user-given name of the website
+
+    Returns:
+        str: The lowercase host name, or the lowercase text itself if it doesn't look like a link
+    """
+    from urllib.parse import urlsplit
+
+    text = site.strip().lower()
+    try:
+        host = urlsplit(text if '://' in text else '//' + text).hostname
+    except ValueError:
+        host = None
+    return (host or text).rstrip('.')
+
+@functools.lru_cache(maxsize=4096)
+def site_key(site: str) -> str:
+    """Standardizes a website name into the key its data is saved under, remembering recent names
+
+    Args:
+        site (str): The user-given name of the website
+
+    Returns:
+        str: The registrable domain of the website, like "example.com" or "example.co.uk"
+    """
+    import ipaddress
+
+    host = host_name(site)
+
+    # addresses and names that aren't made of dotted labels are used as they are
+    labels = host.split('.')
+    if len(labels) < 2 or '' in labels:
+        return host
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+
+    # keeping the public suffix plus the one label in front of it, or the whole name if it is itself a suffix
+    length = _suffix_length(labels)
+    if len(labels) <= length:
+        return host
+    return '.'.join(labels[-(length + 1):])
@@ -1,26 +1,154 @@
+import pw_startup
 import sys
+import threading
 from os import path, mkdir, getcwd, remove
-from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import QApplication, QMainWindow, QDialog, QLineEdit
+from PyQt6.QtCore import Qt, QStringListModel, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QApplication, QMainWindow, QDialog, QLineEdit, QFileDialog, QInputDialog, QMessageBox, QProgressDialog, QCompleter
 from PyQt6.QtGui import QIcon
 from pw_manager import *
-from PyQt6 import uic
+import pw_manager
+import pw_search
+from pw_agent import connect
 import configparser
 
-# Making the default directory for our extra files
-curr_directory = getcwd()
-path_ = path.join(curr_directory, "config")
-if not path.exists(path_):
-    mkdir(path_)
-
-# Making the settings file to save user settings
+# the file user settings are saved in
 settings_location: str = './config/settings.ini'
-if not path.isfile(settings_location):
-    config = configparser.ConfigParser()
-    config['Section 1'] = {"Mode": "light"}
-    configfile = open(settings_location, 'w')
-    config.write(configfile)
-    configfile.close()
+
+def init_settings() -> None:
+    """Makes the config folder and the settings file with the default settings if they don't exist yet
+
+    This used to happen whenever the module was imported, it's now part of starting the application.
+    """
+    # Making the default directory for our extra files
+    curr_directory = getcwd()
+    path_ = path.join(curr_directory, "config")
+    if not path.exists(path_):
+        mkdir(path_)
+
+    # Making the settings file to save user settings
+    if not path.isfile(settings_location):
+        config = configparser.ConfigParser()
+        config['Section 1'] = {"Mode": "light"}
+        configfile = open(settings_location, 'w')
+        config.write(configfile)
+        configfile.close()
+
+# the compiled form class for each .ui file, or None when the .ui file has to be loaded at runtime
+_forms: dict = {}
+
+def _compiled_form(name: str):
+    """Finds the form class compile_ui.py made from a .ui file, as long as the .ui file hasn't changed since
+
+    Args:
+        name (str): The name of the .ui file without its extension
+
+    Returns:
+        type: The compiled form class, or None if there isn't an up to date one
+    """
+    if name in _forms:
+        return _forms[name]
+
+    import importlib
+    from compile_ui import FORMS_PACKAGE, UI_FOLDER, ui_digest
+
+    form = None
+    try:
+        forms = importlib.import_module(FORMS_PACKAGE)
+        if forms.SOURCES.get(name) == ui_digest(path.join(UI_FOLDER, name + '.ui')):
+            form = importlib.import_module(f'{FORMS_PACKAGE}.{name}').Form
+    except (ImportError, AttributeError, OSError):
+        pass
+    _forms[name] = form
+    return form
+
+def load_form(widget, name: str) -> None:
+    """Builds a designer form onto a dialog or window, from its compiled class when there is one
+
+    Args:
+        widget (QWidget): The dialog or window to build the form onto
+        name (str): The name of the .ui file without its extension
+    """
+    form = _compiled_form(name)
+    if form is None:
+        # parsing the .ui file, which is what every dialog did before forms were compiled
+        from compile_ui import UI_FOLDER
+        from PyQt6 import uic
+        uic.loadUi(path.join(UI_FOLDER, name + '.ui'), widget)
+        return
+
+    # the compiled form keeps its widgets on itself, so handing them to the widget the way loadUi does
+    ui = form()
+    ui.setupUi(widget)
+    for attribute, child in vars(ui).items():
+        setattr(widget, attribute, child)
+
+class TaskCancelled(Exception):
+    """Raised inside a vault operation to stop it when its worker is cancelled"""
+
+class WorkerSignals(QObject):
+    """The signals a VaultWorker sends back to the GUI thread, which Qt delivers there through the event loop"""
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    progress = pyqtSignal(int, int)
+
+class VaultWorker(QRunnable):
+    """Runs one vault operation on a worker thread so decrypting or changing keys never blocks the window
+
+    The result, or the error it raised, comes back through the finished or failed signal. If the operation takes a
+    progress callback it reports through the progress signal, and cancelling stops it at its next progress report.
+    Anything else that is cancelled finishes in the background and its result is dropped.
+
+    Args:
+        function (Callable): The vault operation to run
+        *args: The arguments to pass to it
+        reports_progress (bool, optional): Whether to pass the operation a progress callback. Defaults to False.
+    """
+    def __init__(self, function, *args, reports_progress: bool = False):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.reports_progress = reports_progress
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Asks the operation to stop, which is safe to call from the GUI thread at any time
+        """
+        self._cancelled.set()
+
+    def run(self):
+        """Runs the operation on the worker thread and sends back how it ended
+        """
+        if self._cancelled.is_set():
+            self.signals.cancelled.emit()
+            return
+
+        try:
+            if self.reports_progress:
+                result = self.function(*self.args, progress=self.report)
+            else:
+                result = self.function(*self.args)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.failed.emit(error)
+        else:
+            if self._cancelled.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
+    def report(self, done: int, total: int):
+        """The progress callback handed to the operation, which is also where a cancelled operation stops
+
+        Args:
+            done (int): How much of the operation is done
+            total (int): How much there is to do
+        """
+        self.signals.progress.emit(done, total)
+        if self._cancelled.is_set() and done < total:
+            raise TaskCancelled()
 
 class PINChanger(QDialog):
     """The dialog box to set or reset a PIN to access the application
@@ -31,7 +159,7 @@ class PINChanger(QDialog):
     def __init__(self):
         # Initializing the class and the pre-made UI 
         super().__init__()
-        uic.loadUi('./ui/pinCreate.ui', self)
+        load_form(self, 'pinCreate')
 
         # Hiding the message received if the fields do not match and hiding the password text from prying eyes
         self.errorMsg.hide()
@@ -61,46 +189,41 @@ class PINChanger(QDialog):
         self.close()
 
 class PINChecker(QDialog):
-    """Function to check the provided PIN against the saved PIN
+    """Function to check the provided PIN against the vault's PIN
 
     Args:
         QDialog (type): The meta class from the PyQt library that instantiates a dialog box object
     """
-    def __init__(self, file_name: str):
+    def __init__(self):
         """Initializes the object and adds the functionality
-
-        Args:
-            file_name (str): the path to the file where the PIN is stored
         """
         super().__init__()
-        uic.loadUi('./ui/pinCheck.ui', self)
-        self.filename: str = file_name
-        self.pinValid: str = 'incorrect'
+        load_form(self, 'pinCheck')
 
         self.pinEdit.setEchoMode(QLineEdit.EchoMode.Password)
 
         self.buttonBox.accepted.connect(self.submit)
         self.buttonBox.rejected.connect(self.cancel)
 
+        self.reset()
+
+    def reset(self):
+        """Clears the last attempt so the dialog can be opened again
+        """
+        self.pinValid: str = 'incorrect'
+        self.pin: str = None
+        self.pinEdit.clear()
+
     def submit(self):
         """A function to check the data and submit back to main window
         """
-        import pickle
-
-        # Getting the encrypted PIN and decrypting it
-        file = open(self.filename, 'rb')
-        encrypted_pin = pickle.load(file)
-        file.close()
-        pin = decryption(encrypted_pin)
-
-        # Resaving the encrypted version of the PIN
-        file = open(self.filename, 'wb')
-        pickle.dump(encrypted_pin, file)
-        file.close()
+        # the first check unlocks the vault with the PIN, later ones are checked in memory until the keys are locked
+        pin = self.pinEdit.text()
 
         # checking if the pin is valid and closing the dialog
-        if self.pinEdit.text() == pin:
+        if session.verify_pin(pin):
             self.pinValid = 'correct'
+            self.pin = pin
             self.close()
         else:
             self.pinValid = 'incorrect'
@@ -120,7 +243,7 @@ class KeysChanged(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/keys_changed.ui', self)
+        load_form(self, 'keys_changed')
 
         self.buttonBox.accepted.connect(self.accept)
     
@@ -137,7 +260,7 @@ class DelPin(QDialog):
         """Initializes the window and adds the button functionality
         """
         super().__init__()
-        uic.loadUi('./ui/del_pin.ui', self)
+        load_form(self, 'del_pin')
 
         self.buttonBox.accepted.connect(self.accept)
         self.buttonBox.rejected.connect(self.cancelation)
@@ -166,17 +289,28 @@ class DelDialog(QDialog):
         """Initializes the window and adds the button functionality
         """
         super().__init__()
-        uic.loadUi('./ui/deletion.ui', self)
+        load_form(self, 'deletion')
 
         self.buttonBox.accepted.connect(self.accept)
         self.buttonBox.rejected.connect(self.cancelation)
-            
+
+        self.confirm: DelConfirm = None
+        self.reset()
+
+    def reset(self):
+        """Clears the last site entered so the dialog can be opened again
+        """
+        self.sitename = -1
+        self.site.clear()
     
     def accept(self):
         """When accept button is clicked, opens confirmation dialog and saves sitename before closing 
         """
-        # open confirmation dialog
-        confirm = DelConfirm()
+        # open confirmation dialog, building it the first time
+        if self.confirm is None:
+            self.confirm = DelConfirm()
+        confirm = self.confirm
+        confirm.reset()
         confirm.exec()
 
         # checks if user confirmed deletion or canceled and saves sitename
@@ -202,10 +336,15 @@ class DelConfirm(QDialog):
         """Initializing the window and adding the button functionality
         """
         super().__init__()
-        uic.loadUi('./ui/confirmDeletion.ui', self)
+        load_form(self, 'confirmDeletion')
 
         self.confirmation.accepted.connect(self.accept)
         self.confirmation.rejected.connect(self.cancelation)
+        self.reset()
+
+    def reset(self):
+        """Forgets the last answer so the dialog can be opened again
+        """
         self.accepted = False
     
     def accept(self):
@@ -227,7 +366,7 @@ class DeleteSuccess(QDialog):
     """
     def __init__(self) -> None:
         super().__init__()
-        uic.loadUi('./ui/deletesuccess.ui', self)
+        load_form(self, 'deletesuccess')
 
         self.buttonBox.accepted.connect(self.accepted)
     
@@ -244,7 +383,7 @@ class NewPass(QDialog):
     """
     def __init__(self) -> None:
         super().__init__()
-        uic.loadUi('./ui/newPass.ui', self)
+        load_form(self, 'newPass')
 
         self.buttonBox.accepted.connect(self.submit)
         self.buttonBox.rejected.connect(self.cancel)
@@ -272,15 +411,14 @@ class NewPass(QDialog):
                 self.disallowed.append('d')
             if self.punctuation.isChecked():
                 self.disallowed.append('p')
-            self.otherExclusions = self.others.text()
-            self.otherExclusions.replace(' ', '')
+            self.otherExclusions = self.others.text().replace(' ', '')
 
             self.exclusions = ''
             for i in self.disallowed:
                 self.exclusions += i
             if self.otherExclusions != '':
                 self.exclusions += ' ' + self.otherExclusions
-            
+
             self.site_name = self.sitename.text()
             self.username = self.user_name.text()
             self.close()
@@ -302,7 +440,7 @@ class NewPassConfirm(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/saveConfirm.ui', self)
+        load_form(self, 'saveConfirm')
 
         self.buttonBox.accepted.connect(self.accept)
         self.buttonBox.rejected.connect(self.cancel)
@@ -327,7 +465,7 @@ class SaveSuccess(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/saveSuccess.ui', self)
+        load_form(self, 'saveSuccess')
 
         self.buttonBox.accepted.connect(self.ok)
     
@@ -342,14 +480,79 @@ class LoadDialog(QDialog):
     Args:
         QDialog (type): The meta class from the PyQt library that instantiates a dialog box object
     """
-    def __init__(self):
+    def __init__(self, search=None, workers: QThreadPool = None):
         super().__init__()
-        uic.loadUi('./ui/loadDialog.ui', self)
+        load_form(self, 'loadDialog')
 
         self.buttonBox.accepted.connect(self.accept)
         self.buttonBox.rejected.connect(self.cancel)
 
+        # suggesting saved sites as the user types, including close spellings that don't start with the text, with
+        # the searching done on the worker pool since the first search decrypts every site
+        self.search = search
+        self.workers = workers or QThreadPool.globalInstance()
+        self.searching: VaultWorker = None
+        self.waiting_text: str = None
+        if search is not None:
+            self.suggestions = QStringListModel(self)
+            self.completer = QCompleter(self.suggestions, self)
+            self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+            self.site_name.setCompleter(self.completer)
+            self.site_name.textEdited.connect(self.suggest)
+
+        self.reset(search, workers)
+
+    def reset(self, search=None, workers: QThreadPool = None):
+        """Clears the last site entered and its suggestions so the dialog can be opened again
+
+        Args:
+            search (Callable[[str], List[Tuple[str, str]]], optional): The same search the dialog was built with. Defaults to None.
+            workers (QThreadPool, optional): The same pool the dialog was built with. Defaults to None.
+        """
         self.sitename = -1
+        self.waiting_text = None
+        self.site_name.clear()
+        if self.search is not None:
+            self.suggestions.setStringList([])
+
+    def suggest(self, text):
+        """A function to update the suggested sites whenever the user changes the site name
+
+        Only one search runs at a time, and text typed while it runs waits so only the newest is searched next.
+
+        Args:
+            text (str): What the user has typed so far
+        """
+        if self.searching is not None:
+            self.waiting_text = text
+            return
+
+        self.searching = VaultWorker(self.search, text)
+        self.searching.signals.finished.connect(self.show_suggestions)
+        self.searching.signals.failed.connect(self.search_done)
+        self.workers.start(self.searching)
+
+    def show_suggestions(self, matches):
+        """A function to show the sites a search found, unless the user has typed more since it started
+
+        Args:
+            matches (List[Tuple[str, str]]): The website name and username of each matching account
+        """
+        self.search_done()
+        if self.searching is None and self.site_name.hasFocus():
+            self.suggestions.setStringList(list(dict.fromkeys(site for site, username in matches)))
+            self.completer.complete()
+
+    def search_done(self, error=None):
+        """A function to start the search for text typed while the last one ran
+
+        Args:
+            error (Exception, optional): Why the last search failed, which only costs us its suggestions. Defaults to None.
+        """
+        self.searching = None
+        if self.waiting_text is not None:
+            text, self.waiting_text = self.waiting_text, None
+            self.suggest(text)
     
     def accept(self):
         """A function to get the name of the site/application on Submit
@@ -371,29 +574,51 @@ class LoadedPassDialog(QDialog):
     """
     def __init__(self, site, user, pw):
         super().__init__()
-        uic.loadUi('./ui/loadedPassDialog.ui', self)
+        load_form(self, 'loadedPassDialog')
+
+        # fixing the boxes so the data can't be changed
+        self.pass_box.setReadOnly(True)
+        self.user_box.setReadOnly(True)
+
+        # connecting all the buttons to their functions
+        self.buttonBox.accepted.connect(self.ok)
+        self.copyUser.clicked.connect(self.copy_user)
+        self.copyPw.clicked.connect(self.copy_pass)
+        self.showHide.clicked.connect(self.show_hide)
+
+        self.reset(site, user, pw)
 
+    def reset(self, site, user, pw):
+        """Shows another account's data so the dialog can be opened again
+
+        Args:
+            site (str): The name of the website
+            user (str): The username saved for it
+            pw (str): The password saved for it
+        """
         # setting the passed arguments for use
         self.site = site
         self.user = user
         self.pw = pw
 
-        # fixing the boxes so the data can't be changed or the passwords seen on screen at first
+        # hiding the password on screen at first
         self.echo_mode = 'Password'
         self.pass_box.setEchoMode(QLineEdit.EchoMode.Password)
-        self.pass_box.setReadOnly(True)
-        self.user_box.setReadOnly(True)
 
         # setting the text in the label and boxes
         self.data_label.setText(f"Data for {site}:")
         self.user_box.setText(self.user)
         self.pass_box.setText(self.pw)
 
-        # connecting all the buttons to their functions
-        self.buttonBox.accepted.connect(self.ok)
-        self.copyUser.clicked.connect(self.copy_user)
-        self.copyPw.clicked.connect(self.copy_pass)
-        self.showHide.clicked.connect(self.show_hide)
+    def hideEvent(self, event):
+        """Clears the password once the dialog is put away, since the dialog itself is kept for the next load
+
+        Args:
+            event (QHideEvent): The hide event sent by Qt
+        """
+        self.pw = None
+        self.pass_box.clear()
+        super().hideEvent(event)
     
     def ok(self):
         """Closing the dialog when the user is done"""
@@ -427,7 +652,7 @@ class PassError(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/passError.ui', self)
+        load_form(self, 'passError')
 
         self.buttonBox.accepted.connect(self.ok)
     
@@ -443,7 +668,7 @@ class SetDialog(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/setDialog.ui', self)
+        load_form(self, 'setDialog')
 
         self.buttonBox.accepted.connect(self.accept)
         self.buttonBox.rejected.connect(self.cancel)
@@ -472,7 +697,7 @@ class ManualDialog(QDialog):
     """
     def __init__(self):
         super().__init__()
-        uic.loadUi('./ui/manualDialog.ui', self)
+        load_form(self, 'manualDialog')
 
         # hiding error message for if/when needed
         self.error_msg.hide()
@@ -508,18 +733,40 @@ class Pwm(QMainWindow):
     def __init__(self):
         # Initializing the window
         super().__init__()
-        uic.loadUi('./ui/mainWindow.ui', self)
+        load_form(self, 'mainWindow')
         self.setWindowIcon(QIcon('pwm.ico'))
 
+        # the dialogs opened on every load, save or delete, which are built once and reused
+        self.dialogs: dict = {}
+
         # Initializing the file structure
         self.filename = filename
         self.public = public
         self.private = private
-        self.pin_location = '.\config\pin.pickle'
         initializer()
 
-        # If user has added PIN protection, asks for PIN before opeing main window
-        if path.isfile(self.pin_location):
+        # moving a PIN saved by an older version into the vault's key-wrap section, reading old pickles only as plain bytes
+        legacy_pin = '.\config\pin.pickle'
+        if path.isfile(legacy_pin):
+            with open(legacy_pin, 'rb') as file:
+                encrypted_pin = load_legacy_pickle(file.read())
+            if encrypted_pin is not None:
+                set_pin(decryption(encrypted_pin))
+            remove(legacy_pin)
+        self.has_pin = has_pin()
+
+        # talking to the agent if one is running, otherwise working on the vault in this process
+        agent = connect()
+        self.vault = agent if agent is not None else pw_manager
+        self.search = agent.search if agent is not None else pw_search.search
+
+        # running vault operations on one worker thread, so they keep their order and the window keeps drawing
+        self.workers = QThreadPool(self)
+        self.workers.setMaxThreadCount(1)
+        self.tasks = set()
+
+        # If user has added PIN protection, asks for PIN before opeing main window, which unlocks the vault
+        if self.has_pin:
             self.checkPin()
             if self.pinValid == 'incorrect':
                 sys.exit()
@@ -529,6 +776,7 @@ class Pwm(QMainWindow):
         self.actionDelete_PIN.triggered.connect(self.deletePin)
         self.actionDarkMode.triggered.connect(self.changeMode)
         self.actionChangeKeys.triggered.connect(self.changeKeys)
+        self.actionTransferData.triggered.connect(self.transferData)
 
         # Adding the functionality for the buttons
         self.newPassword.clicked.connect(self.new_pass)
@@ -536,37 +784,128 @@ class Pwm(QMainWindow):
         self.setPassword.clicked.connect(self.set_pass)
         self.deletePassword.clicked.connect(self.delete_pass)
 
+    def closeEvent(self, event):
+        """Stops any running vault operations and locks the key session so the unwrapped key doesn't outlive the window
+
+        Args:
+            event (QCloseEvent): The close event sent by Qt
+        """
+        for worker in list(self.tasks):
+            worker.cancel()
+        self.workers.waitForDone()
+        cancel_rotation()
+        session.lock()
+        super().closeEvent(event)
+
+    def dialog(self, dialog_class, *args):
+        """Gets the window's copy of a dialog that's opened often, building it the first time
+
+        Args:
+            dialog_class (type): The dialog to open, which resets itself from the same arguments it's built with
+            *args: The arguments to build or reset the dialog with
+
+        Returns:
+            QDialog: The dialog, ready to be opened
+        """
+        dialog = self.dialogs.get(dialog_class)
+        if dialog is None:
+            dialog = self.dialogs[dialog_class] = dialog_class(*args)
+        elif hasattr(dialog, 'reset'):
+            dialog.reset(*args)
+        return dialog
+
+    def run_task(self, title: str, function, *args, finished=None, failed=None, cancelled=None, progress=None):
+        """Runs a vault operation on the worker thread, showing a busy cursor until it ends
+
+        The callbacks are called on the GUI thread, so they can open dialogs and update the window.
+
+        Args:
+            title (str): The title of the warning shown if the operation fails and failed isn't given
+            function (Callable): The vault operation to run
+            *args: The arguments to pass to it
+            finished (Callable[[Any], None], optional): Called with what the operation returned. Defaults to None.
+            failed (Callable[[Exception], None], optional): Called with the error instead of showing a warning. Defaults to None.
+            cancelled (Callable[[], None], optional): Called if the operation was cancelled. Defaults to None.
+            progress (Callable[[int, int], None], optional): Passes the operation a progress callback and is called with each report. Defaults to None.
+
+        Returns:
+            VaultWorker: The worker, which can be cancelled
+        """
+        worker = VaultWorker(function, *args, reports_progress=progress is not None)
+        self.tasks.add(worker)
+
+        def end():
+            self.tasks.discard(worker)
+            QApplication.restoreOverrideCursor()
+
+        def on_finished(result):
+            end()
+            if finished is not None:
+                finished(result)
+
+        def on_failed(error):
+            end()
+            if failed is not None:
+                failed(error)
+            else:
+                QMessageBox.warning(self, title, f"Something went wrong: {error}")
+
+        def on_cancelled():
+            end()
+            if cancelled is not None:
+                cancelled()
+
+        # connecting everything before the worker starts, so no signal can be sent before we listen for it
+        worker.signals.finished.connect(on_finished)
+        worker.signals.failed.connect(on_failed)
+        worker.signals.cancelled.connect(on_cancelled)
+        if progress is not None:
+            worker.signals.progress.connect(progress)
+
+        QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor)
+        self.workers.start(worker)
+        return worker
+
     def changePin(self):
-        """Functionality to add or change the encrypted PIN
+        """Functionality to add or change the PIN the vault is unlocked with
         """
-        import pickle
+        # asking for the current PIN first if there is one
+        self.checkPin()
+        if self.pinValid != 'correct':
+            return
 
         # opening pin change dialog box
         pin_dialog = PINChanger()
         pin_dialog.exec()
 
-        # if the pin was set, making and/or updating the PIN file with the new PIN
+        # if the pin was set, wrapping the vault's key with the new PIN on the worker thread
         if pin_dialog.changed:
             pin = pin_dialog.pin.text()
-            encrypted_pin = encryption(pin)
-            if not path.isfile(self.pin_location):
-                file = open(self.pin_location, 'x')
-                file.close()
-            file = open(self.pin_location, 'wb')
-            pickle.dump(encrypted_pin, file)
+
+            def pin_set(result):
+                self.has_pin = True
+
+            self.run_task("Change PIN", set_pin, pin, finished=pin_set)
     
     def deletePin(self):
-        """Functionality to delete the encrypted PIN
+        """Functionality to stop unlocking the vault with a PIN
         """
-        # making sure PIN exists
-        if path.isfile(self.pin_location):
+        # making sure PIN exists and that the user knows it
+        if self.has_pin:
+            self.checkPin()
+            if self.pinValid != 'correct':
+                return
+
             # running confirmation dialog
             confirmation = DelPin()
             confirmation.exec()
 
-            # if deletion is confirmed, deleting PIN
+            # if deletion is confirmed, removing the PIN from the vault on the worker thread
             if confirmation.confirmed == True:
-                remove(self.pin_location)
+                def pin_removed(result):
+                    self.has_pin = False
+
+                self.run_task("Delete PIN", set_pin, None, finished=pin_removed)
 
     def changeMode(self):
         """Functionality to change between dark and light mode
@@ -586,35 +925,82 @@ class Pwm(QMainWindow):
     def changeKeys(self):
         """Functionality to change the encryption keys in case data is compromised
         """
-        import pickle
-
-        # getting PIN information from file and unencrypting it
-        pin_loc = open(self.pin_location, 'rb')
-        encrypted_pin: bytes = pickle.load(pin_loc)
-        pin_loc.close()
-        curr_pin: str = decryption(encrypted_pin)
-
-        # changing encryption keys and re-encrypting the password data
-        newKeys()
-
-        # re-encrypting PIN information with new encryption keys
-        new_pin = encryption(curr_pin)
-        pin_loc = open(self.pin_location, 'wb')
-        pickle.dump(new_pin, pin_loc)
-
-        # showing dialog that tells user everything has been sucessfully changed
-        changed = KeysChanged()
-        changed.exec()
-
-    def checkPin(self):
-        """If PIN exists, checking the user submitted PIN against the one on file to authorize/deny app access
+        # asking for the PIN, since the new keys have to be wrapped with it too
+        curr_pin = self.checkPin()
+        if self.pinValid != 'correct':
+            return
+
+        # showing how many records have been re-encrypted while the keys change, with a button to stop
+        progress_dialog = QProgressDialog("Re-encrypting saved passwords...", "Cancel", 0, 0, self)
+        progress_dialog.setWindowTitle("Changing Keys")
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+
+        def show_progress(done: int, total: int):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(done)
+
+        def keys_changed(result):
+            progress_dialog.close()
+
+            # showing dialog that tells user everything has been sucessfully changed
+            changed = KeysChanged()
+            changed.exec()
+
+        def keys_kept(error=None):
+            # throwing away the half made keys so the old ones stay in use
+            progress_dialog.close()
+            cancel_rotation()
+            if error is not None:
+                QMessageBox.warning(self, "Changing Keys", f"The keys were not changed: {error}")
+
+        # changing encryption keys and re-encrypting the password data on the worker thread
+        worker = self.run_task("Changing Keys", lambda progress: newKeys(progress, curr_pin), finished=keys_changed, failed=keys_kept, cancelled=keys_kept, progress=show_progress)
+        progress_dialog.canceled.connect(worker.cancel)
+
+    def transferData(self):
+        """Functionality to import passwords exported from another password manager or from this one
         """
+        # asking which export file to bring in
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import Passwords", "", "Exports (*.csv *.json *.jsonl *.pwexport);;All Files (*)")
+        if not file_path:
+            return
+
+        # encrypted exports from this program need the passphrase they were protected with
+        passphrase = None
+        if not file_path.lower().endswith(('.csv', '.json', '.jsonl')):
+            passphrase, entered = QInputDialog.getText(self, "Import Passwords", "Export passphrase:", QLineEdit.EchoMode.Password)
+            if not entered:
+                return
+
+        # importing the file in batches on the worker thread, through the agent if one is running, and telling the user how it went
+        agent = None if self.vault is pw_manager else self.vault
+        self.run_task(
+            "Import Passwords", import_file, file_path, passphrase, agent,
+            finished=lambda imported: QMessageBox.information(self, "Import Passwords", f"{imported} passwords successfully imported"),
+            failed=lambda error: QMessageBox.warning(self, "Import Passwords", f"Could not import {file_path}: {error}"),
+        )
+
+    def checkPin(self) -> str:
+        """If PIN exists, checking the user submitted PIN against the vault's PIN to authorize/deny app access
+
+        Returns:
+            str: The PIN the user entered if it was correct, otherwise None
+        """
+        # letting the user through if there is no PIN to check
+        if not self.has_pin:
+            self.pinValid = 'correct'
+            return None
+
         # opening checker dialog box
-        checker = PINChecker(self.pin_location)
+        checker = self.dialog(PINChecker)
         checker.exec()
 
-        # checking dialog box attribute to see if pin is valid
+        # checking dialog box attribute to see if pin is valid, without keeping the PIN in the reused dialog
         self.pinValid = checker.pinValid
+        pin = checker.pin
+        checker.reset()
+        return pin
 
     def new_pass(self):
         """Saves username and password data after generating a new password
@@ -624,29 +1010,35 @@ class Pwm(QMainWindow):
         newpass_dialog.exec()
 
         if newpass_dialog.submitted == True:
-            # creates password based on length and exclusions provided
+            # creates password based on length and the compiled policy for the exclusions provided, which
+            # requires every allowed kind of character and is shared by sites with the same rules
             length = newpass_dialog.length
-            exclusions = newpass_dialog.exclusions
-            password = new_pass(length, exclusions)
+            try:
+                password = policy_for(newpass_dialog.exclusions, length).generate(length)
+            except ValueError as error:
+                QMessageBox.warning(self, "New Password", f"Couldn't make a password with those settings: {error}")
+                return
 
-            # saves and encrypts password
             site = newpass_dialog.site_name
             user = newpass_dialog.username
-            save_pass(site, user, password)
 
-            # instantiates and runs dialog to show password has been saved successfully
-            saved_pass = SaveSuccess()
-            saved_pass.exec()
+            def saved(result):
+                # instantiates and runs dialog to show password has been saved successfully
+                saved_pass = self.dialog(SaveSuccess)
+                saved_pass.exec()
 
-            # opens the loaded pasword dialog so the user can access their new password immediately
-            pass_dialog = LoadedPassDialog(site, user, password)
-            pass_dialog.exec()
+                # opens the loaded pasword dialog so the user can access their new password immediately
+                pass_dialog = self.dialog(LoadedPassDialog, site, user, password)
+                pass_dialog.exec()
+
+            # saves and encrypts password on the worker thread
+            self.run_task("New Password", self.vault.save_pass, site, user, password, finished=saved)
 
     def load_pass(self):
         """Loads previously saved user data
         """
         # instantiates dialog to get site/app name
-        load_dialog = LoadDialog()
+        load_dialog = self.dialog(LoadDialog, self.search, self.workers)
         load_dialog.exec()
 
         site  = load_dialog.sitename
@@ -656,15 +1048,34 @@ class Pwm(QMainWindow):
             # checks user PIN again to helps stop data leaks
             self.checkPin()
             if self.pinValid == 'correct':
-                try:
-                    # retrieving user data and showing it
-                    site, user, pw = get_pass(site)
-                    pass_dialog = LoadedPassDialog(site, user, pw)
-                    pass_dialog.exec()
-                except KeyError:
-                    # if no data was found, showing that to user
-                    error_dialog = PassError()
-                    error_dialog.exec()
+                # retrieving every account saved for the site on the worker thread
+                self.run_task("Load Password", self.vault.list_accounts, site, finished=self.show_accounts)
+
+    def show_accounts(self, accounts):
+        """Shows the user data of a loaded site, asking which account to show when there is more than one
+
+        Args:
+            accounts (List[Tuple[str, str, str]]): The website name, username, and password of each account on the site
+        """
+        if not accounts:
+            # if no data was found, showing that to user
+            error_dialog = self.dialog(PassError)
+            error_dialog.exec()
+            return
+
+        # asking which account to show when there is more than one
+        account = accounts[0]
+        if len(accounts) > 1:
+            usernames = [username for site_name, username, pw in accounts]
+            username, ok = QInputDialog.getItem(self, "Load Password", "Which account would you like to load?", usernames, 0, False)
+            if not ok:
+                return
+            account = accounts[usernames.index(username)]
+
+        # showing the user data
+        site, user, pw = account
+        pass_dialog = self.dialog(LoadedPassDialog, site, user, pw)
+        pass_dialog.exec()
 
     def set_pass(self):
         """Setting or resetting user data either manually or automatically
@@ -682,18 +1093,16 @@ class Pwm(QMainWindow):
             manual_dialog.exec()
 
             try:
-                # getting user input from dialog and saving password
+                # getting user input from dialog
                 site = manual_dialog.sitename
                 user = manual_dialog.username
                 password = manual_dialog.password
-                save_pass(site, user, password)
-
-                # instantiates and runs dialog to show data has been saved successfully
-                saved_pass = SaveSuccess()
-                saved_pass.exec()
             except AttributeError:
                 # doing nothing if no data was entered
-                pass
+                return
+
+            # saving the password on the worker thread, then showing a dialog to show data has been saved successfully
+            self.run_task("Set Password", self.vault.save_pass, site, user, password, finished=lambda result: self.dialog(SaveSuccess).exec())
         else:
             # if user did not select a method to enter data, doing nothing
             pass
@@ -702,29 +1111,57 @@ class Pwm(QMainWindow):
         """Allows user to select data to delete from the database
         """
         # opens the dialog to enter information about deleting password
-        deletion = DelDialog()
+        deletion = self.dialog(DelDialog)
         deletion.exec()
 
         # stores either the name of the website or a -1 if no name is found
         site = deletion.sitename
 
-        # if a site name was entered, executing the deletion
+        # if a site name was entered, finding its accounts on the worker thread before executing the deletion
         if type(site) == str:
-            try:
-                delete_pass(site)
+            self.run_task("Delete Password", self.vault.list_accounts, site, finished=lambda accounts: self.delete_account(site, accounts))
+
+    def delete_account(self, site, accounts):
+        """Deletes the user data of a site, asking which account to delete when the site has more than one
 
-                # telling the user the deletion was successful
-                delete_success = DeleteSuccess()
-                delete_success.exec()
-            except KeyError:
-                error = PassError()
-                error.exec()
+        Args:
+            site (str): The name of the website whose data is to be deleted
+            accounts (List[Tuple[str, str, str]]): The website name, username, and password of each account on the site
+        """
+        username = None
+        if len(accounts) > 1:
+            choices = [account[1] for account in accounts] + ["All accounts"]
+            choice, ok = QInputDialog.getItem(self, "Delete Password", "Which account would you like to delete?", choices, 0, False)
+            if not ok:
+                return
+            if choices.index(choice) < len(accounts):
+                username = choice
+
+        def deleted(result):
+            # telling the user the deletion was successful
+            delete_success = self.dialog(DeleteSuccess)
+            delete_success.exec()
+
+        def not_deleted(error):
+            if not isinstance(error, KeyError):
+                QMessageBox.warning(self, "Delete Password", f"Something went wrong: {error}")
+                return
+            error = self.dialog(PassError)
+            error.exec()
+
+        self.run_task("Delete Password", self.vault.delete_pass, site, username, finished=deleted, failed=not_deleted)
 
 def main():
     """Main entry point that starts the application when the file is the main file running
     """
+    pw_startup.mark("imports")
+
+    # making the config folder and settings before anything reads them
+    init_settings()
+
     # Instantiates the QApplication object
     app = QApplication([])
+    pw_startup.mark("application")
 
     # determines which stylesheet to use based on the current setting
     config = configparser.ConfigParser()
@@ -739,9 +1176,11 @@ def main():
 
     # Makes an instance of the Password Manager GUI
     window = Pwm()
+    pw_startup.mark("vault opened")
 
-    # Shows the GUI to the screen
+    # Shows the GUI to the screen, which has happened once the event loop gets to its first pass
     window.show()
+    QTimer.singleShot(0, lambda: pw_startup.ready("window shown") and app.quit())
 
     # Allows the user to close and minimize/maximize the window
     sys.exit(app.exec())
@@ -1,28 +1,1672 @@
-from typing import Tuple
-import pickle
-import rsa
-from cryptography.fernet import Fernet
+from typing import List, Tuple, TYPE_CHECKING
+from contextlib import contextmanager
+import atexit
+import functools
+import hashlib
+import hmac
+import string
+import struct
+import threading
+import time
+from pw_domains import host_name, site_key
+import pw_trace
+
+# the cipher classes are only imported when first used, which keeps them out of startup
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 # initializing file names
 filename = '.\config\passwords.pickle'
 public = '.\config\public.pem'
 private = '.\config\private.pem'
 symmetric = '.\config\symmetric.bin'
+record_log = '.\config\passwords.log'
+rotation_journal = '.\config\keychange.json'
+lock_file = '.\config\passwords.lock'
+index_file = '.\config\passwords.idx'
+
+# layout of the vault file: a fixed header of the magic and the length of the key-wrap section, the key-wrap section
+# of (scheme, wrapped symmetric key) entries, then records of a site tag, an account tag, a payload length and the
+# payload, so every account on a site can be found from the headers alone
+LOG_MAGIC = b'PWLOG\x04'
+LOG_HEADER = struct.Struct('>6sI')
+KEY_ENTRY = struct.Struct('>16sH')
+TAG_SIZE = 16
+RECORD_HEADER = struct.Struct(f'>{TAG_SIZE}s{TAG_SIZE}sI')
+
+# a record's payload is an AES-GCM nonce and the sealed fields, each a length and UTF-8 text, with both tags in the
+# record header as associated data so a payload can't be moved onto another account's header
+NONCE_SIZE = 12
+FIELD_LENGTH = struct.Struct('>H')
+RECORD_FIELDS = ('key', 'site', 'username', 'password')
+
+# layout of the index snapshot: a magic header, which version of the log it covers and how far, then every account's
+# tag, site tag and record location sorted by account tag, then the site and account tag pairs sorted by site tag
+INDEX_MAGIC = b'PWIDX\x01'
+INDEX_HEADER = struct.Struct('>QQQQ32s')
+INDEX_ENTRY = struct.Struct(f'>{TAG_SIZE}s{TAG_SIZE}sQI')
+INDEX_SITE_ENTRY = struct.Struct(f'>{TAG_SIZE}s{TAG_SIZE}s')
+
+# number of records appended or deleted since the last index snapshot before a save writes a new one
+SNAPSHOT_EVERY = 4096
+
+# how much of the end of the covered log the snapshot keeps a digest of, to tell if the log was swapped underneath it
+SNAPSHOT_CHECK = 64
+
+# size in bits of newly generated RSA keys and the backend used to wrap the symmetric key with them
+KEY_SIZE = 3072
+DEFAULT_KEY_WRAP = 'rsa-oaep'
+
+# the key-wrap section entry holding the symmetric key wrapped with a key derived from the PIN and the private key,
+# which starts with the scrypt salt and cost (log2 of n, r and p) and then holds the AES-GCM nonce and sealed key
+PIN_SCHEME = 'pin-scrypt'
+PIN_KDF = struct.Struct('>16sBBB')
+PIN_COST = (15, 8, 1)
+
+class PurePythonKeyWrap:
+    """Wraps the symmetric key with RSA PKCS#1 v1.5 using the pure Python rsa package
+
+    This is how the symmetric key was always wrapped before, so it is kept to read keys from older versions.
+    """
+    name = 'rsa-pkcs1v15'
 
-def repickle(data: dict) -> None:
-    """Resaves the data after unpickling
+    def generate(self, bits: int) -> Tuple[bytes, bytes]:
+        """Generates a new RSA key pair
+
+        Args:
+            bits (int): The size of the RSA modulus in bits
+
+        Returns:
+            Tuple[bytes, bytes]: The PEM encoded public and private keys
+        """
+        import rsa
+
+        public_key, private_key = rsa.newkeys(bits)
+        return public_key.save_pkcs1("PEM"), private_key.save_pkcs1("PEM")
+
+    def wrap(self, key: bytes, public_pem: bytes) -> bytes:
+        """Encrypts the symmetric key with the public key
+
+        Args:
+            key (bytes): The symmetric key to wrap
+            public_pem (bytes): The PEM encoded public key
+
+        Returns:
+            bytes: The wrapped key
+        """
+        import rsa
+
+        return rsa.encrypt(key, rsa.PublicKey.load_pkcs1(public_pem))
+
+    def unwrap(self, wrapped: bytes, private_pem: bytes) -> bytes:
+        """Decrypts the symmetric key with the private key
+
+        Args:
+            wrapped (bytes): The wrapped key
+            private_pem (bytes): The PEM encoded private key
+
+        Returns:
+            bytes: The symmetric key
+        """
+        import rsa
+
+        return rsa.decrypt(wrapped, rsa.PrivateKey.load_pkcs1(private_pem))
+
+class NativeKeyWrap:
+    """Wraps the symmetric key with RSA-OAEP using the cryptography package's native implementation
+
+    Key generation and unwrapping run in compiled code, so secure key sizes take milliseconds instead of seconds.
+    The PEM files use the same PKCS#1 layout as the rsa package, so either backend can read the other's keys.
+    """
+    name = 'rsa-oaep'
+
+    def _padding(self):
+        """Makes the OAEP padding settings used for wrapping
+
+        Returns:
+            OAEP: OAEP padding with SHA-256
+        """
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        return padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+    def generate(self, bits: int) -> Tuple[bytes, bytes]:
+        """Generates a new RSA key pair
+
+        Args:
+            bits (int): The size of the RSA modulus in bits
+
+        Returns:
+            Tuple[bytes, bytes]: The PEM encoded public and private keys
+        """
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+        public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.PKCS1)
+        private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption())
+        return public_pem, private_pem
+
+    def wrap(self, key: bytes, public_pem: bytes) -> bytes:
+        """Encrypts the symmetric key with the public key
+
+        Args:
+            key (bytes): The symmetric key to wrap
+            public_pem (bytes): The PEM encoded public key
+
+        Returns:
+            bytes: The wrapped key
+        """
+        from cryptography.hazmat.primitives import serialization
+
+        return serialization.load_pem_public_key(public_pem).encrypt(key, self._padding())
+
+    def unwrap(self, wrapped: bytes, private_pem: bytes) -> bytes:
+        """Decrypts the symmetric key with the private key
+
+        Args:
+            wrapped (bytes): The wrapped key
+            private_pem (bytes): The PEM encoded private key
+
+        Returns:
+            bytes: The symmetric key
+        """
+        from cryptography.hazmat.primitives import serialization
+
+        return serialization.load_pem_private_key(private_pem, password=None).decrypt(wrapped, self._padding())
+
+# the available ways of wrapping the symmetric key, by the scheme name saved in the key-wrap section
+KEY_WRAP_BACKENDS = {backend.name: backend for backend in (PurePythonKeyWrap(), NativeKeyWrap())}
+
+def load_legacy_pickle(data: bytes) -> bytes:
+    """Reads the bytes saved in a pickle by an older version, refusing anything that isn't plain bytes
 
     Args:
-        data (dict): the dictionary containing all the data to repickle
+        data (bytes): The contents of the pickle file
+
+    Returns:
+        bytes: The saved bytes, or None if the file was empty
     """
-    encrypted_data = encryption(data)
+    import io
+    import pickle
+
+    class _BytesUnpickler(pickle.Unpickler):
+        """Reads the pickles older versions saved, which only ever held bytes, without running anything they name
+
+        A pickle can name any function to call while it loads, so instead of trusting the file the only global
+        allowed is the one older pickle protocols use to rebuild bytes.
+        """
+        def find_class(self, module: str, name: str):
+            if (module, name) == ('_codecs', 'encode'):
+                import codecs
+                return codecs.encode
+            raise pickle.UnpicklingError(f"refusing to load {module}.{name} from a vault file")
+
+    try:
+        saved = _BytesUnpickler(io.BytesIO(data)).load()
+    except EOFError:
+        return None
+    if not isinstance(saved, bytes):
+        raise pickle.UnpicklingError("vault pickles from older versions only hold bytes")
+    return saved
+
+def _pack_log_header(wrapped_keys: dict) -> bytes:
+    """Makes the fixed header and key-wrap section that start a vault file
+
+    Args:
+        wrapped_keys (dict): The wrapped symmetric key for each key wrapping scheme it is saved under
+
+    Returns:
+        bytes: The header and key-wrap section
+    """
+    section = b''.join(KEY_ENTRY.pack(scheme.encode('ascii'), len(wrapped)) + wrapped for scheme, wrapped in wrapped_keys.items())
+    return LOG_HEADER.pack(LOG_MAGIC, len(section)) + section
+
+def _records_start(view, log_path: str = None) -> int:
+    """Finds where the records start in a vault file, after its header and key-wrap section
+
+    Args:
+        view (memoryview): The start of the vault file, or all of it
+        log_path (str, optional): The file the view is of, for the error message. Defaults to record_log.
+
+    Returns:
+        int: The offset of the first record
+    """
+    if len(view) < LOG_HEADER.size or bytes(view[:len(LOG_MAGIC)]) != LOG_MAGIC:
+        raise ValueError(f"{log_path or record_log} is not a password vault")
+    magic, section_length = LOG_HEADER.unpack_from(view, 0)
+    return LOG_HEADER.size + section_length
+
+def _holds_records(log_path: str) -> bool:
+    """Checks whether a vault file has anything after its key-wrap section, or isn't a vault file we can read
+
+    Args:
+        log_path (str): The vault file to check
+
+    Returns:
+        bool: True if the file has records, or anything that might be, that only its current keys can read
+    """
+    from os import path
+
+    if not path.isfile(log_path):
+        return False
+    with mapped_log(log_path) as view:
+        if len(view) == 0:
+            return False
+        if view[:len(LOG_MAGIC)].tobytes() != LOG_MAGIC:
+            return True
+        return len(view) > _records_start(view, log_path)
 
-    file = open(filename, 'wb')
+def read_key_section(log_path: str = record_log, key_path: str = symmetric) -> dict:
+    """Reads the wrapped symmetric key saved under each key wrapping scheme
 
-    pickle.dump(encrypted_data, file)
+    Args:
+        log_path (str, optional): The vault file whose key-wrap section to read. Defaults to record_log.
+        key_path (str, optional): Where versions before the key-wrap section kept the wrapped key. Defaults to symmetric.
+
+    Returns:
+        dict: The wrapped key for each scheme
+    """
+    from os import path
+
+    header = b''
+    if path.isfile(log_path):
+        with open(log_path, 'rb') as file:
+            header = file.read(LOG_HEADER.size)
+            if header.startswith(LOG_MAGIC):
+                magic, section_length = LOG_HEADER.unpack(header)
+                section = file.read(section_length)
+
+    # vaults from older versions have no vault file yet and their key pickled in symmetric.bin, wrapped with rsa
+    if not header.startswith(LOG_MAGIC):
+        with open(key_path, 'rb') as key_file:
+            return {PurePythonKeyWrap.name: load_legacy_pickle(key_file.read())}
+
+    wrapped_keys: dict = {}
+    offset = 0
+    while offset < len(section):
+        scheme, length = KEY_ENTRY.unpack_from(section, offset)
+        offset += KEY_ENTRY.size
+        wrapped_keys[scheme.rstrip(b'\0').decode('ascii')] = section[offset:offset + length]
+        offset += length
+    return wrapped_keys
+
+def read_wrapped_key(log_path: str = record_log, key_path: str = symmetric) -> Tuple[str, bytes]:
+    """Reads the wrapped symmetric key and the name of the scheme it was wrapped with
+
+    Args:
+        log_path (str, optional): The vault file whose key-wrap section to read. Defaults to record_log.
+        key_path (str, optional): Where versions before the key-wrap section kept the wrapped key. Defaults to symmetric.
+
+    Returns:
+        Tuple[str, bytes]: The key wrapping scheme and the wrapped key
+    """
+    for scheme, wrapped in read_key_section(log_path, key_path).items():
+        if scheme in KEY_WRAP_BACKENDS:
+            return scheme, wrapped
+    raise ValueError(f"{log_path} has no key wrapped with a scheme this version can unwrap")
+
+def write_wrapped_key(scheme: str, wrapped: bytes, log_path: str = record_log, keep_others: bool = False) -> None:
+    """Saves the wrapped symmetric key in the vault file's key-wrap section, creating the file if it doesn't exist
+
+    The records of an existing vault file are copied over behind the new header. A file in an older layout is
+    replaced, since only the keys that were just replaced could have read it.
+
+    Args:
+        scheme (str): The name of the key wrapping backend
+        wrapped (bytes): The wrapped key, or None to remove the scheme's entry
+        log_path (str, optional): The vault file to save the wrapped key in. Defaults to record_log.
+        keep_others (bool, optional): Keeps the entries for other schemes, for when the same key is wrapped another way. Defaults to False.
+    """
+    from os import path
+
+    wrapped_keys = read_key_section(log_path) if keep_others else {}
+    wrapped_keys[scheme] = wrapped
+    wrapped_keys = {name: entry for name, entry in wrapped_keys.items() if entry is not None}
+
+    with atomic_open(log_path) as new_log:
+        new_log.write(_pack_log_header(wrapped_keys))
+        if path.isfile(log_path):
+            with mapped_log(log_path) as view:
+                if bytes(view[:len(LOG_MAGIC)]) == LOG_MAGIC:
+                    new_log.write(view[_records_start(view, log_path):])
+
+def _pin_key(pin: str, salt: bytes, cost: tuple, private_pem: bytes) -> bytes:
+    """Derives the key-encryption key for a PIN with scrypt, which takes about 32 MiB and a noticeable fraction of a second per guess
+
+    The scrypt output is keyed with the private key file, so the PIN can't be guessed from the vault file alone and
+    the PIN only ever saves the RSA unwrap, never the need for the private key.
+
+    Args:
+        pin (str): The PIN
+        salt (bytes): The random salt saved with the wrapped key
+        cost (tuple): log2 of scrypt's n, then its r and p
+        private_pem (bytes): The PEM encoded private key
+
+    Returns:
+        bytes: A 256 bit AES key
+    """
+    log_n, r, p = cost
+    stretched = hashlib.scrypt(pin.encode('utf-8'), salt=salt, n=2 ** log_n, r=r, p=p, maxmem=2**26, dklen=32)
+    return hmac.new(private_pem, stretched, hashlib.sha256).digest()
+
+def wrap_with_pin(key: bytes, pin: str, private_pem: bytes) -> bytes:
+    """Seals the symmetric key under a key derived from a PIN, for the PIN's entry in the key-wrap section
+
+    Args:
+        key (bytes): The symmetric key
+        pin (str): The PIN
+        private_pem (bytes): The PEM encoded private key the vault's key is wrapped for
+
+    Returns:
+        bytes: The salt and cost, nonce and sealed key
+    """
+    import secrets
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    salt = secrets.token_bytes(16)
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    sealed = AESGCM(_pin_key(pin, salt, PIN_COST, private_pem)).encrypt(nonce, key, PIN_SCHEME.encode('ascii'))
+    return PIN_KDF.pack(salt, *PIN_COST) + nonce + sealed
+
+def unwrap_with_pin(wrapped: bytes, pin: str, private_pem: bytes) -> bytes:
+    """Opens the symmetric key sealed by wrap_with_pin, which only works with the right PIN and private key
+
+    Args:
+        wrapped (bytes): The PIN's entry in the key-wrap section
+        pin (str): The PIN to try
+        private_pem (bytes): The PEM encoded private key the vault's key is wrapped for
+
+    Returns:
+        bytes: The symmetric key, or None if the PIN is wrong
+    """
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    salt, *cost = PIN_KDF.unpack_from(wrapped)
+    nonce = wrapped[PIN_KDF.size:PIN_KDF.size + NONCE_SIZE]
+    try:
+        return AESGCM(_pin_key(pin, salt, cost, private_pem)).decrypt(nonce, wrapped[PIN_KDF.size + NONCE_SIZE:], PIN_SCHEME.encode('ascii'))
+    except InvalidTag:
+        return None
+
+# number of idle seconds before the unwrapped symmetric key is dropped from memory
+SESSION_TIMEOUT = 300
+
+class KeySession:
+    """Holds the unwrapped symmetric key in memory so the RSA unwrap only happens once per process
+
+    Args:
+        timeout (float, optional): Seconds of inactivity before the key is locked again. Defaults to SESSION_TIMEOUT.
+        suffix (str, optional): Added to the key file names to read a different generation of keys. Defaults to ''.
+    """
+    def __init__(self, timeout: float = SESSION_TIMEOUT, suffix: str = ''):
+        self.timeout = timeout
+        self.private_path: str = private + suffix
+        self.log_path: str = record_log + suffix
+        self.symmetric_path: str = symmetric + suffix
+        self._key: bytearray = None
+        self._fernet: 'Fernet' = None
+        self._aead: 'AESGCM' = None
+        self._index_key: bytearray = None
+        self._verifier_key: bytearray = None
+        self._pin_verifier: bytes = None
+        self._last_used: float = 0.0
+        self._timer: threading.Timer = None
+        self._lock = threading.RLock()
+
+        # functions to call whenever the key is forgotten, so anything decrypted with it can be forgotten too
+        self.on_lock: list = []
+
+    def is_unlocked(self) -> bool:
+        """Checks whether the symmetric key is currently held in memory
+
+        Returns:
+            bool: True if the key is unwrapped and has not timed out
+        """
+        with self._lock:
+            return self._fernet is not None and time.monotonic() - self._last_used <= self.timeout
+
+    def fernet(self) -> 'Fernet':
+        """Gets the Fernet object for the vault, unwrapping the symmetric key first if needed
+
+        Returns:
+            Fernet: The symmetric cipher built from the unwrapped key
+        """
+        with self._lock:
+            if not self.is_unlocked():
+                self.lock()
+                self._unwrap()
+            self._last_used = time.monotonic()
+            return self._fernet
+
+    def aead(self) -> 'AESGCM':
+        """Gets the AES-GCM cipher the records are sealed with, unwrapping the symmetric key first if needed
+
+        Returns:
+            AESGCM: The authenticated cipher built from a key derived from the unwrapped key
+        """
+        with self._lock:
+            self.fernet()
+            return self._aead
+
+    def tag(self, site_name: str, username: str = None) -> bytes:
+        """Makes the keyed hash that identifies a site's records, or one account's records on it, without revealing either
+
+        Args:
+            site_name (str): The standardized key the site's data is saved under
+            username (str, optional): The username of one account on the site. Defaults to None for the site itself.
+
+        Returns:
+            bytes: A TAG_SIZE long HMAC of the site name and username
+        """
+        message = site_name if username is None else f"{site_name}\0{username}"
+        with self._lock:
+            self.fernet()
+            return hmac.new(bytes(self._index_key), message.encode('utf-8'), hashlib.sha256).digest()[:TAG_SIZE]
+
+    def lock(self) -> None:
+        """Zeroizes and forgets the unwrapped key so the next operation has to unwrap it again
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            held = self._fernet is not None
+
+            # overwriting our copies of the keys before dropping them
+            for secret in (self._key, self._index_key, self._verifier_key):
+                if secret is not None:
+                    for i in range(len(secret)):
+                        secret[i] = 0
+            self._key = None
+            self._index_key = None
+            self._verifier_key = None
+            self._pin_verifier = None
+            self._fernet = None
+            self._aead = None
+
+            if held:
+                for listener in self.on_lock:
+                    listener()
+
+    def unlock_with_pin(self, pin: str) -> bool:
+        """Unwraps the symmetric key with a key derived from the PIN and the private key, instead of the RSA unwrap
+
+        This is the one slow PIN check, after it the PIN is checked against a verifier kept in memory until the
+        session locks.
+
+        Args:
+            pin (str): The PIN the user entered
+
+        Returns:
+            bool: False if the PIN is wrong or the vault has no PIN
+        """
+        wrapped = read_key_section(self.log_path, self.symmetric_path).get(PIN_SCHEME)
+        if wrapped is None:
+            return False
+        with open(self.private_path, 'rb') as f:
+            private_pem = f.read()
+        with pw_trace.span('key.pin_unwrap', len(wrapped)):
+            key = unwrap_with_pin(wrapped, pin, private_pem)
+        if key is None:
+            return False
+
+        with self._lock:
+            # keeping a session the private key already unlocked, so what was decrypted with it isn't dropped
+            if not (self.is_unlocked() and hmac.compare_digest(key, bytes(self._key))):
+                self.lock()
+                self._install(key)
+            self._last_used = time.monotonic()
+            self._pin_verifier = self._pin_digest(pin)
+        return True
+
+    def verify_pin(self, pin: str) -> bool:
+        """Checks a PIN, against the verifier in memory while the session is unlocked, or by unlocking with it
+
+        Args:
+            pin (str): The PIN the user entered
+
+        Returns:
+            bool: True if it's the vault's PIN
+        """
+        with self._lock:
+            if self._pin_verifier is not None and self.is_unlocked():
+                self._last_used = time.monotonic()
+                return hmac.compare_digest(self._pin_digest(pin), self._pin_verifier)
+        return self.unlock_with_pin(pin)
+
+    def pin_wrap(self, pin: str) -> bytes:
+        """Wraps the symmetric key with a key derived from a new PIN, which also becomes the PIN checked in memory
+
+        Args:
+            pin (str): The new PIN, or None to forget the PIN
+
+        Returns:
+            bytes: The entry for the PIN in the key-wrap section, or None if the PIN was forgotten
+        """
+        with self._lock:
+            if pin is None:
+                self._pin_verifier = None
+                return None
+            self.fernet()
+            with open(self.private_path, 'rb') as f:
+                private_pem = f.read()
+            self._pin_verifier = self._pin_digest(pin)
+            return wrap_with_pin(bytes(self._key), pin, private_pem)
+
+    def _pin_digest(self, pin: str) -> bytes:
+        """Makes the in-memory verifier for a PIN, keyed so it's useless once the session locks
+
+        Args:
+            pin (str): The PIN
+
+        Returns:
+            bytes: An HMAC of the PIN
+        """
+        return hmac.new(bytes(self._verifier_key), pin.encode('utf-8'), hashlib.sha256).digest()
+
+    def _unwrap(self) -> None:
+        """Reads the key files and decrypts the symmetric key with the private key
+        """
+        # getting private asymmetric key to decrypt symmetric key
+        with open(self.private_path, 'rb') as f:
+            private_pem = f.read()
+
+        # getting and unencrypting symmetric encryption key with the backend it was wrapped with
+        scheme, encrypted_key = read_wrapped_key(self.log_path, self.symmetric_path)
+        with pw_trace.span('key.unwrap', len(encrypted_key)):
+            self._install(KEY_WRAP_BACKENDS[scheme].unwrap(encrypted_key, private_pem))
+
+    def _install(self, key: bytes) -> None:
+        """Holds an unwrapped symmetric key and the keys derived from it, and starts the idle timer
+
+        Args:
+            key (bytes): The symmetric key
+        """
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self._key = bytearray(key)
+        self._fernet = Fernet(bytes(self._key))
+
+        # deriving separate keys for the records and the site tags so no key is used for two things
+        self._aead = AESGCM(hmac.new(bytes(self._key), b'pw_manager record key', hashlib.sha256).digest())
+        self._index_key = bytearray(hmac.new(bytes(self._key), b'pw_manager site index', hashlib.sha256).digest())
+        self._verifier_key = bytearray(hmac.new(bytes(self._key), b'pw_manager pin verifier', hashlib.sha256).digest())
+        self._schedule_expiry(self.timeout)
+
+    def _schedule_expiry(self, delay: float) -> None:
+        """Starts a background timer that locks the session once it has been idle for the timeout
+
+        Args:
+            delay (float): Seconds to wait before checking if the session is idle
+        """
+        self._timer = threading.Timer(delay, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self) -> None:
+        """Timer callback that locks the session if it went unused, or waits out the rest of the timeout
+        """
+        with self._lock:
+            if self._fernet is None:
+                return
+            idle = time.monotonic() - self._last_used
+            if idle >= self.timeout:
+                self.lock()
+            else:
+                self._schedule_expiry(self.timeout - idle)
+
+# the key session shared by every vault operation in this process
+session = KeySession()
+
+def has_pin(log_path: str = record_log) -> bool:
+    """Checks whether the vault can be unlocked with a PIN
+
+    Args:
+        log_path (str, optional): The vault file to check. Defaults to record_log.
+
+    Returns:
+        bool: True if the key-wrap section has an entry for a PIN
+    """
+    from os import path
+
+    return path.isfile(log_path) and PIN_SCHEME in read_key_section(log_path)
+
+class VaultLock:
+    """Shared and exclusive advisory locks on the vault that work across processes, plus a generation counter
+
+    Readers hold the shared lock so they never block each other, and writers hold the exclusive lock while they
+    change the log and bump the generation saved in the lock file. Threads in the same process share one lock on
+    the file, and the thread holding the exclusive lock can take either lock again. On Windows only exclusive
+    locks are available, so readers there take turns.
+    """
+    # the byte in the lock file that is locked on Windows, kept clear of the generation counter
+    LOCK_OFFSET = 64
+
+    def __init__(self):
+        self._file = None
+        self._readers: int = 0
+        self._owner: int = None
+        self._depth: int = 0
+        self._condition = threading.Condition(threading.RLock())
+
+    @contextmanager
+    def shared(self):
+        """Holds the shared lock, letting other readers in but keeping writers out
+        """
+        me = threading.get_ident()
+        with self._condition:
+            while self._owner not in (None, me):
+                self._condition.wait()
+            if self._readers == 0 and self._owner is None:
+                self._lock_file(exclusive=False)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0 and self._owner is None:
+                    self._unlock_file()
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        """Holds the exclusive lock, keeping every other reader and writer out
+        """
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner != me:
+                while self._owner is not None or self._readers > 0:
+                    self._condition.wait()
+                self._lock_file(exclusive=True)
+                self._owner = me
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+                    self._unlock_file()
+                self._condition.notify_all()
+
+    def generation(self) -> int:
+        """Reads the generation counter, which goes up every time a writer commits
+
+        Returns:
+            int: The current generation of the vault
+        """
+        return self.counters()[0]
+
+    def counters(self) -> Tuple[int, int, int]:
+        """Reads the generation counter along with the counts of times the log has been rewritten and the keys changed
+
+        Returns:
+            Tuple[int, int, int]: The current generation of the vault, the number of rewrites and the number of key changes
+        """
+        with self._condition:
+            self._open()
+            self._file.seek(0)
+            data = self._file.read(24).ljust(24, b'\0')
+            return tuple(int.from_bytes(data[i:i + 8], 'big') for i in (0, 8, 16))
+
+    def bump(self, rewritten: bool = False, rekeyed: bool = False) -> int:
+        """Moves the generation counter on after a commit, which has to happen under the exclusive lock
+
+        Args:
+            rewritten (bool, optional): Whether the log was replaced or cut short instead of appended to. Defaults to False.
+            rekeyed (bool, optional): Whether the encryption keys were changed. Defaults to False.
+
+        Returns:
+            int: The new generation of the vault
+        """
+        with self._condition:
+            generation, rewrites, rekeys = self.counters()
+            generation += 1
+            rewrites += int(rewritten)
+            rekeys += int(rekeyed)
+            self._file.seek(0)
+            self._file.write(b''.join(counter.to_bytes(8, 'big') for counter in (generation, rewrites, rekeys)))
+            return generation
+
+    def _open(self) -> None:
+        """Opens the lock file the first time it is needed, creating it if it doesn't exist
+        """
+        from os import path
+
+        if self._file is None:
+            if not path.isfile(lock_file):
+                open(lock_file, 'ab').close()
+            # unbuffered so every generation read sees what other processes wrote
+            self._file = open(lock_file, 'r+b', buffering=0)
+
+    def _lock_file(self, exclusive: bool) -> None:
+        """Takes the lock on the lock file, waiting for other processes to let go of it
+
+        Args:
+            exclusive (bool): Whether to take the exclusive lock instead of the shared one
+        """
+        self._open()
+        try:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except ImportError:
+            import msvcrt
+            self._file.seek(self.LOCK_OFFSET)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds, so we keep waiting like flock does
+                    continue
+
+    def _unlock_file(self) -> None:
+        """Lets go of the lock on the lock file
+        """
+        try:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            self._file.seek(self.LOCK_OFFSET)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+# the lock shared by every vault operation in this process
+vault_lock = VaultLock()
+
+@contextmanager
+def mapped_log(log_path: str = None):
+    """Maps the record log into memory so records are read straight out of the page cache
+
+    Only the pages a lookup or scan actually touches are read from disk, so the memory used depends on the records
+    read instead of the size of the vault. The mapping only lasts for the block, since Windows can't replace a file
+    that is still mapped; take any slices as bytes before the block ends. The caller should hold vault_lock.
+
+    Args:
+        log_path (str, optional): The log to map. Defaults to record_log.
 
+    Yields:
+        memoryview: A read only view of the whole log
+    """
+    import mmap
+    from os import fstat
+
+    with open(log_path or record_log, 'rb') as file:
+        if fstat(file.fileno()).st_size == 0:
+            yield memoryview(b'')
+            return
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        with memoryview(mapping) as view:
+            yield view
+    finally:
+        mapping.close()
+
+class RecordIndex:
+    """Keeps the location of the newest record for each account so lookups only decrypt one record
+
+    The locations come from two layers. The index snapshot is a sorted table of every account saved up to some point
+    in the log, mapped into memory and binary searched, so opening a large vault only reads the pages a lookup
+    touches instead of every record header. Records appended after the snapshot are scanned into dictionaries on top
+    of it, and because the log only grows between compactions, refreshing after another save only has to read the
+    headers that were appended since. Finding one account or every account on a site never decrypts anything.
+    """
+    def __init__(self):
+        self.dead: int = 0
+        self.end: int = 0
+        self._generation: int = None
+        self._rewrites: int = None
+        self._rekeys: int = None
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forgets every record location, closing the mapped snapshot
+        """
+        if self._snapshot is not None:
+            self._snapshot[0].close()
+        self._snapshot = None
+        self._appended: dict = {}
+        self._removed: set = set()
+        self._sites: dict = {}
+        self._count: int = 0
+        self.dead = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def refresh(self) -> None:
+        """Brings the index up to date with the record log, starting again from the snapshot only if the log was replaced
+
+        The caller should hold vault_lock so the log can't change part way through.
+        """
+        from os import stat
+
+        with self._lock:
+            # nothing has been committed by any process since the last refresh
+            generation, rewrites, rekeys = vault_lock.counters()
+            if generation == self._generation:
+                return
+            self._generation = generation
+
+            # another process changed the keys, so the key this process unwrapped can't read the log anymore
+            if rekeys != self._rekeys:
+                if self._rekeys is not None:
+                    session.lock()
+                self._rekeys = rekeys
+
+            # the log was rewritten by a compaction or key change, so every offset we know is stale
+            size = stat(record_log).st_size
+            if rewrites != self._rewrites or size < self.end:
+                self._reset()
+                self._rewrites = rewrites
+                self._load_snapshot(size)
+
+            if size != self.end:
+                self._scan()
+
+    def locate(self, tag: bytes) -> Tuple[int, int]:
+        """Finds the newest record for an account tag
+
+        Args:
+            tag (bytes): The account tag made by KeySession.tag
+
+        Returns:
+            Tuple[int, int]: The offset and length of the encrypted payload, or None if the account has no data
+        """
+        self.refresh()
+        return self._get(tag)
+
+    def accounts(self, site_tag: bytes) -> dict:
+        """Finds the newest record for every account on a site
+
+        Args:
+            site_tag (bytes): The site tag made by KeySession.tag
+
+        Returns:
+            dict: The offset and length of the encrypted payload for each account tag on the site
+        """
+        self.refresh()
+        found: dict = {}
+        for tag in self._snapshot_accounts(site_tag) | self._sites.get(site_tag, set()):
+            location = self._get(tag)
+            if location is not None:
+                found[tag] = location
+        return found
+
+    def latest(self, site_tag: bytes) -> Tuple[int, int]:
+        """Finds the record of the account saved most recently on a site, which is the one used when no username is given
+
+        Args:
+            site_tag (bytes): The site tag made by KeySession.tag
+
+        Returns:
+            Tuple[int, int]: The offset and length of the encrypted payload, or None if the site has no data
+        """
+        accounts = self.accounts(site_tag)
+        return max(accounts.values()) if accounts else None
+
+    def items(self):
+        """Goes through the newest record of every account, without refreshing first
+
+        The records come in account tag order, not the order they were saved in, so anything rewriting the log
+        has to sort them by offset to keep the account saved most recently on each site last.
+
+        Yields:
+            Tuple[bytes, Tuple[int, int]]: The account tag and the offset and length of its encrypted payload
+        """
+        if self._snapshot is not None:
+            mapping, count = self._snapshot
+            base = len(INDEX_MAGIC) + INDEX_HEADER.size
+            for position in range(count):
+                tag, site_tag, offset, length = INDEX_ENTRY.unpack_from(mapping, base + position * INDEX_ENTRY.size)
+                if tag not in self._appended and tag not in self._removed:
+                    yield tag, (offset, length)
+        yield from self._appended.items()
+
+    def snapshot_due(self) -> bool:
+        """Checks if enough records were appended since the snapshot that opening the vault would have to scan many
+
+        Returns:
+            bool: True if save_snapshot should be called
+        """
+        return len(self._appended) + len(self._removed) >= SNAPSHOT_EVERY
+
+    @pw_trace.traced('index.snapshot')
+    def save_snapshot(self) -> None:
+        """Writes every account's record location to the index snapshot so opening the vault doesn't scan the log
+
+        The caller should hold vault_lock.exclusive() and have just refreshed the index. The snapshot only speeds up
+        opening the vault, so if it can't be replaced (like on Windows while another process has it mapped) the old
+        one is left for refresh to catch up from.
+        """
+        # the site tag of each account is read back out of its record header
+        entries = []
+        with mapped_log() as view:
+            for tag, (offset, length) in self.items():
+                start = offset - RECORD_HEADER.size
+                entries.append((tag, view[start:start + TAG_SIZE].tobytes(), offset, length))
+            digest = hashlib.sha256(view[max(0, self.end - SNAPSHOT_CHECK):self.end]).digest()
+        entries.sort()
+        pairs = sorted((site_tag, tag) for tag, site_tag, offset, length in entries)
+
+        try:
+            with atomic_open(index_file) as file:
+                file.write(INDEX_MAGIC + INDEX_HEADER.pack(self._rewrites, self.end, len(entries), self.dead, digest))
+                file.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in entries))
+                file.write(b''.join(INDEX_SITE_ENTRY.pack(*pair) for pair in pairs))
+        except OSError:
+            return
+
+        # switching over to the new snapshot, which covers everything we had scanned
+        with self._lock:
+            rewrites, end = self._rewrites, self.end
+            self._reset()
+            self._rewrites = rewrites
+            self._load_snapshot(end)
+
+    def _load_snapshot(self, size: int) -> None:
+        """Maps the index snapshot if it was written for the current log, leaving the index empty otherwise
+
+        Args:
+            size (int): The current size of the record log
+        """
+        import mmap
+        from os import path
+
+        if not path.isfile(index_file):
+            return
+        with open(index_file, 'rb') as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return
+
+        # checking the snapshot is whole and was taken from this version of the log
+        base = len(INDEX_MAGIC) + INDEX_HEADER.size
+        if len(mapping) < base or mapping[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            mapping.close()
+            return
+        rewrites, end, count, dead, digest = INDEX_HEADER.unpack_from(mapping, len(INDEX_MAGIC))
+        valid = (rewrites == self._rewrites and end <= size
+                 and len(mapping) == base + count * (INDEX_ENTRY.size + INDEX_SITE_ENTRY.size))
+        if valid:
+            with mapped_log() as view:
+                valid = hashlib.sha256(view[max(0, end - SNAPSHOT_CHECK):end]).digest() == digest
+        if not valid:
+            mapping.close()
+            return
+
+        self._snapshot = (mapping, count)
+        self._count = count
+        self.dead = dead
+        self.end = end
+
+    def _get(self, tag: bytes) -> Tuple[int, int]:
+        """Finds the newest record for an account tag in the records scanned since the snapshot, then the snapshot
+
+        Args:
+            tag (bytes): The account tag made by KeySession.tag
+
+        Returns:
+            Tuple[int, int]: The offset and length of the encrypted payload, or None if the account has no data
+        """
+        location = self._appended.get(tag)
+        if location is not None or tag in self._removed or self._snapshot is None:
+            return location
+
+        # binary searching the account tags, comparing only the tag at the start of each entry
+        mapping, count = self._snapshot
+        base = len(INDEX_MAGIC) + INDEX_HEADER.size
+        entry_size = INDEX_ENTRY.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * entry_size
+            if mapping[start:start + TAG_SIZE] < tag:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count:
+            found, site_tag, offset, length = INDEX_ENTRY.unpack_from(mapping, base + low * entry_size)
+            if found == tag:
+                return offset, length
+        return None
+
+    def _snapshot_accounts(self, site_tag: bytes) -> set:
+        """Finds the account tags the snapshot has on a site, some of which may have been deleted since
+
+        Args:
+            site_tag (bytes): The site tag made by KeySession.tag
+
+        Returns:
+            set: The account tags saved on the site when the snapshot was taken
+        """
+        if self._snapshot is None:
+            return set()
+
+        # binary searching for the first pair on the site, then reading pairs until the site changes
+        mapping, count = self._snapshot
+        base = len(INDEX_MAGIC) + INDEX_HEADER.size + count * INDEX_ENTRY.size
+        pair_size = INDEX_SITE_ENTRY.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * pair_size
+            if mapping[start:start + TAG_SIZE] < site_tag:
+                low = middle + 1
+            else:
+                high = middle
+
+        tags = set()
+        while low < count:
+            found, tag = INDEX_SITE_ENTRY.unpack_from(mapping, base + low * pair_size)
+            if found != site_tag:
+                break
+            tags.add(tag)
+            low += 1
+        return tags
+
+    def _scan(self) -> None:
+        """Reads the record headers from where the last scan stopped, without decrypting anything
+
+        The headers are unpacked straight out of the mapped log, so the payloads in between are never read.
+        """
+        unpack_from = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+
+        with mapped_log() as view:
+            size = len(view)
+            offset = self.end
+            if offset == 0:
+                offset = _records_start(view)
+
+            while offset + header_size <= size:
+                site_tag, tag, length = unpack_from(view, offset)
+
+                # stopping at a record that was only partly written
+                if offset + header_size + length > size:
+                    break
+
+                # newer records for an account replace older ones and deletion records remove the account
+                live = self._get(tag) is not None
+                if live:
+                    self.dead += 1
+                if length == 0:
+                    self._appended.pop(tag, None)
+                    self._removed.add(tag)
+                    self.dead += 1
+                    if live:
+                        self._count -= 1
+                    accounts = self._sites.get(site_tag)
+                    if accounts is not None:
+                        accounts.discard(tag)
+                        if not accounts:
+                            del self._sites[site_tag]
+                else:
+                    self._appended[tag] = (offset + header_size, length)
+                    self._removed.discard(tag)
+                    self._sites.setdefault(site_tag, set()).add(tag)
+                    if not live:
+                        self._count += 1
+                offset += header_size + length
+
+        self.end = offset
+
+# the record locations shared by every vault operation in this process
+index = RecordIndex()
+
+# seconds to wait for more saves before making the ones so far durable with a single fsync
+COMMIT_WINDOW = 0.05
+
+def _sync_directory(file_path: str) -> None:
+    """Makes a rename inside a directory durable by syncing the directory itself, where the system allows it
+
+    Args:
+        file_path (str): A file inside the directory that was changed
+    """
+    from os import path, open as os_open, close, fsync, O_RDONLY
+
+    try:
+        directory = os_open(path.dirname(file_path) or '.', O_RDONLY)
+    except OSError:
+        # directories can't be opened on Windows, where the rename is already durable
+        return
+    try:
+        fsync(directory)
+    except OSError:
+        pass
+    finally:
+        close(directory)
+
+@contextmanager
+def atomic_open(file_path: str, mode: str = 'wb'):
+    """Opens a temporary file that only replaces file_path once everything has been written and synced to disk
+
+    The old file is never truncated, so a crash part way through leaves either the old or the new contents.
+
+    Args:
+        file_path (str): The file to replace
+        mode (str, optional): The mode to open the temporary file with. Defaults to 'wb'.
+
+    Yields:
+        IO: The temporary file to write the new contents to
+    """
+    from os import fsync, remove, replace
+
+    temp_path = file_path + '.tmp'
+    file = open(temp_path, mode)
+    try:
+        yield file
+        file.flush()
+        fsync(file.fileno())
+    except BaseException:
+        file.close()
+        remove(temp_path)
+        raise
     file.close()
 
+    replace(temp_path, file_path)
+    _sync_directory(file_path)
+
+class LogWriter:
+    """Appends records to the record log and makes saves that arrive close together durable with one fsync
+
+    Records are written to the log straight away so every reader sees them, but the fsync waits COMMIT_WINDOW
+    seconds so a burst of saves costs a single sync. sync() forces any waiting records to disk immediately.
+
+    Args:
+        window (float, optional): Seconds to wait for more saves before syncing. Defaults to COMMIT_WINDOW.
+    """
+    def __init__(self, window: float = COMMIT_WINDOW):
+        self.window = window
+        self.commits: int = 0
+        self._file = None
+        self._timer: threading.Timer = None
+        self._lock = threading.RLock()
+
+    def append(self, record: bytes, durable: bool = False) -> None:
+        """Writes records to the end of the log and schedules the fsync for them
+
+        Args:
+            record (bytes): One or more records made by _pack_record
+            durable (bool, optional): Whether to sync straight away instead of waiting for more saves. Defaults to False.
+        """
+        with self._lock:
+            self._open()
+            with pw_trace.span('log.write', len(record)):
+                self._file.write(record)
+                self._file.flush()
+
+            if durable or self.window <= 0:
+                self.sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self) -> None:
+        """Syncs every record written so far to disk and closes the log
+        """
+        from os import fsync
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file is not None:
+                with pw_trace.span('log.fsync'):
+                    fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self.commits += 1
+
+    def _open(self) -> None:
+        """Opens the log for appending, reopening it if it was replaced since the last write
+        """
+        from os import fstat, stat
+
+        if self._file is not None:
+            current, ours = stat(record_log), fstat(self._file.fileno())
+            if (current.st_dev, current.st_ino) != (ours.st_dev, ours.st_ino):
+                self.sync()
+        if self._file is None:
+            self._file = open(record_log, 'ab')
+
+# the writer shared by every save in this process, synced one last time when the program exits
+writer = LogWriter()
+atexit.register(writer.sync)
+
+@pw_trace.traced('op.repickle')
+def repickle(data: dict) -> None:
+    """Rewrites the whole record log from a dictionary, encrypting every account as its own record
+
+    Args:
+        data (dict): the dictionary containing all the data to resave, keyed by standardized site name and username, in
+            the order the accounts were saved so the last account of each site stays the one used without a username
+    """
+    # writing the new log next to the old one so a failure part way through leaves the old log intact
+    with vault_lock.exclusive():
+        writer.sync()
+        header = _pack_log_header(read_key_section())
+        with pw_trace.span('vault.rewrite') as traced, atomic_open(record_log) as file:
+            traced.add_bytes(file.write(header))
+            for (site_name, username), site_data in data.items():
+                traced.add_bytes(file.write(_pack_record(site_name, username, site_data)))
+        vault_lock.bump(rewritten=True)
+        index.refresh()
+        index.save_snapshot()
+
+def _pack_record(site_name: str, username: str, site_data: dict = None, keys: KeySession = None) -> bytes:
+    """Encrypts one account's data into a record for the log, or makes a deletion record if there is no data
+
+    Args:
+        site_name (str): The standardized key the site's data is saved under
+        username (str): The username of the account on the site
+        site_data (dict, optional): The site, username and password to save. Defaults to None for a deletion.
+        keys (KeySession, optional): The keys to encrypt the record with. Defaults to the shared session.
+
+    Returns:
+        bytes: The record header followed by the encrypted payload
+    """
+    import secrets
+
+    keys = keys or session
+    site_tag = keys.tag(site_name)
+    tag = keys.tag(site_name, username)
+    if site_data is None:
+        return RECORD_HEADER.pack(site_tag, tag, 0)
+
+    # sealing the fields with the tags as associated data, so the payload only opens under this header
+    fields = dict(site_data, key=site_name)
+    plaintext = b''.join(FIELD_LENGTH.pack(len(value)) + value for value in (fields[name].encode('utf-8') for name in RECORD_FIELDS))
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    with pw_trace.span('record.encrypt', len(plaintext)):
+        payload = nonce + keys.aead().encrypt(nonce, plaintext, site_tag + tag)
+    return RECORD_HEADER.pack(site_tag, tag, len(payload)) + payload
+
+def decrypt_record(record: bytes, keys: KeySession = None) -> dict:
+    """Opens a record made by _pack_record, checking it hasn't been changed or moved onto another account's header
+
+    Args:
+        record (bytes): The record header followed by the encrypted payload
+        keys (KeySession, optional): The keys the record was encrypted with. Defaults to the shared session.
+
+    Returns:
+        dict: The standardized site key under "key", and the site, username and password saved for the account
+    """
+    keys = keys or session
+    header_size = RECORD_HEADER.size
+    nonce = record[header_size:header_size + NONCE_SIZE]
+    with pw_trace.span('record.decrypt', len(record)):
+        plaintext = keys.aead().decrypt(nonce, record[header_size + NONCE_SIZE:], record[:2 * TAG_SIZE])
+
+    # reading the fields back in the order they were packed
+    site_data: dict = {}
+    offset = 0
+    with pw_trace.span('record.parse', len(plaintext)):
+        for name in RECORD_FIELDS:
+            (length,) = FIELD_LENGTH.unpack_from(plaintext, offset)
+            offset += FIELD_LENGTH.size
+            site_data[name] = plaintext[offset:offset + length].decode('utf-8')
+            offset += length
+    return site_data
+
+def _append_record(record: bytes, durable: bool = False) -> None:
+    """Appends a single record to the end of the log without touching the rest of the vault
+
+    Args:
+        record (bytes): A record made by _pack_record
+        durable (bool, optional): Whether to sync straight away instead of coalescing with other saves. Defaults to False.
+    """
+    with vault_lock.exclusive():
+        writer.append(record, durable)
+        vault_lock.bump()
+
+        # dropping old and deleted records once they outnumber the saved sites
+        index.refresh()
+        if index.dead > max(len(index), 64):
+            compact_vault()
+        elif index.snapshot_due():
+            index.save_snapshot()
+
+# number of times a checked commit is retried against newer data before it waits for the exclusive lock instead
+COMMIT_RETRIES = 3
+
+def _commit_checked(prepare, durable: bool = False) -> None:
+    """Commits records that depend on the current state of the vault, without blocking readers while they are made
+
+    prepare() checks the vault and builds the records under the shared lock, after the index has caught up with
+    any key change so records are never encrypted with stale keys. If another process commits before we get the
+    exclusive lock, the generation will have moved and prepare() runs again against the newer data.
+
+    Args:
+        prepare (Callable[[], bytes]): Checks the vault and returns the records to append, raising if the change isn't valid
+        durable (bool, optional): Whether to sync straight away instead of coalescing with other saves. Defaults to False.
+    """
+    for attempt in range(COMMIT_RETRIES):
+        with vault_lock.shared():
+            index.refresh()
+            generation = vault_lock.generation()
+            records = prepare()
+
+        with vault_lock.exclusive():
+            if vault_lock.generation() == generation:
+                _append_record(records, durable)
+                return
+
+    # giving up on being optimistic after repeated conflicts
+    with vault_lock.exclusive():
+        index.refresh()
+        _append_record(prepare(), durable)
+
+def _find_record(site_name: str, username: str = None) -> dict:
+    """Decrypts the newest record for one account using the index, leaving every other record untouched
+
+    Args:
+        site_name (str): The standardized key the site's data is saved under
+        username (str, optional): The username of the account. Defaults to None for the account saved most recently.
+
+    Returns:
+        dict: The site, username and password saved for the account, or None if there is no data
+    """
+    with vault_lock.shared():
+        index.refresh()
+        if username is None:
+            location = index.latest(session.tag(site_name))
+        else:
+            location = index.locate(session.tag(site_name, username))
+        if location is None:
+            return None
+
+        offset, length = location
+        with pw_trace.span('log.read', RECORD_HEADER.size + length), mapped_log() as view:
+            record = view[offset - RECORD_HEADER.size:offset + length].tobytes()
+
+    site_data = decrypt_record(record)
+
+    del site_data["key"]
+    return site_data
+
+@pw_trace.traced('op.compact_vault')
+def compact_vault() -> None:
+    """Rewrites the record log with only the newest record for each site, copying records without decrypting them
+    """
+    with vault_lock.exclusive():
+        writer.sync()
+        index.refresh()
+
+        # closing the old log before the new one replaces it, since Windows can't replace an open file
+        with pw_trace.span('vault.compact') as traced, atomic_open(record_log) as new_log:
+            with mapped_log() as view:
+                traced.add_bytes(new_log.write(view[:_records_start(view)]))
+                # keeping the records in the order they were saved, which is how latest tells accounts apart
+                for offset, length in sorted(location for tag, location in index.items()):
+                    traced.add_bytes(new_log.write(view[offset - RECORD_HEADER.size:offset + length]))
+        vault_lock.bump(rewritten=True)
+
+        # snapshotting the compacted log so the next process to open it doesn't scan it
+        index.refresh()
+        index.save_snapshot()
+
+# the kinds of characters a password can be made of, by the letter the exclusions string uses for each
+CHARACTER_CLASSES = {
+    'l': string.ascii_lowercase,
+    'u': string.ascii_uppercase,
+    'd': string.digits,
+    'p': string.punctuation,
+}
+
+class PasswordPolicy:
+    """The rules a website has for its passwords, compiled once into the characters and placements that satisfy them
+
+    Args:
+        min_length (int, optional): The shortest password allowed. Defaults to 1.
+        max_length (int, optional): The longest password allowed. Defaults to None for no limit.
+        classes (str, optional): The kinds of characters allowed, out of "ludp". Defaults to all of them.
+        minimums (dict, optional): How many characters each kind needs at least. Defaults to one of every allowed kind.
+        banned (str, optional): Single characters that aren't allowed. Defaults to ''.
+    """
+    def __init__(self, min_length: int = 1, max_length: int = None, classes: str = 'ludp', minimums: dict = None, banned: str = ''):
+        if minimums is None:
+            minimums = {kind: 1 for kind in classes}
+        self.min_length = min_length
+        self.max_length = max_length
+        self.classes = ''.join(kind for kind in CHARACTER_CLASSES if kind in classes)
+        self.minimums = tuple((kind, minimums[kind]) for kind in CHARACTER_CLASSES if minimums.get(kind, 0) > 0)
+        self.banned = ''.join(sorted(set(banned)))
+
+        # making sure the policy can be met before any password is made from it
+        for kind, minimum in self.minimums:
+            if kind not in self.classes:
+                raise ValueError(f"characters of kind {kind!r} are required but not allowed")
+        self.compile()
+
+    @property
+    def key(self) -> tuple:
+        """tuple: Everything that decides which passwords the policy allows, for comparing and caching policies"""
+        return self.min_length, self.max_length, self.classes, self.minimums, self.banned
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PasswordPolicy) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return (f"PasswordPolicy(min_length={self.min_length}, max_length={self.max_length}, classes={self.classes!r}, "
+                f"minimums={dict(self.minimums)}, banned={self.banned!r})")
+
+    def compile(self) -> Tuple[str, tuple]:
+        """Works out the characters the policy allows and the characters each required kind can be filled with
+
+        Returns:
+            Tuple[str, tuple]: Every allowed character, and the allowed characters and minimum count of each required kind
+        """
+        return _compile_policy(self.key)
+
+    def shortest(self) -> int:
+        """The shortest password that meets every rule of the policy
+
+        Returns:
+            int: The length of the shortest allowed password
+        """
+        return max(self.min_length, sum(minimum for kind, minimum in self.minimums))
+
+    def generate(self, length: int = None) -> str:
+        """Makes one cryptographically secure password that meets the policy
+
+        Args:
+            length (int, optional): The length of the password. Defaults to the shortest length the policy allows.
+
+        Returns:
+            str: A cryptographically secure password string
+        """
+        return self.generate_many(1, length)[0]
+
+    def generate_many(self, count: int, length: int = None, processes: int = None) -> List[str]:
+        """Makes many cryptographically secure passwords that meet the policy, for bulk provisioning
+
+        Args:
+            count (int): How many passwords to make
+            length (int, optional): The length of each password. Defaults to the shortest length the policy allows.
+            processes (int, optional): Spreads the work across this many processes. Defaults to None for this process only.
+
+        Returns:
+            List[str]: The cryptographically secure password strings
+        """
+        if length is None:
+            length = self.shortest()
+        if length < self.shortest() or (self.max_length is not None and length > self.max_length):
+            raise ValueError(f"a password of length {length} can't meet {self!r}")
+
+        if processes is None or processes < 2 or count < processes * 1000:
+            return _generate_policy_batch(self, count, length)
+
+        # splitting the passwords evenly between the worker processes, which each draw their own randomness
+        from concurrent.futures import ProcessPoolExecutor
+        share, extra = divmod(count, processes)
+        counts = [share + (1 if worker < extra else 0) for worker in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            batches = pool.map(_generate_policy_batch, [self] * processes, counts, [length] * processes)
+            return [password for batch in batches for password in batch]
+
+@functools.lru_cache(maxsize=64)
+def _compile_policy(key: tuple) -> Tuple[str, tuple]:
+    """Compiles a policy's rules into the characters it allows, which stays cached for every policy with the same rules
+
+    Args:
+        key (tuple): The policy's key
+
+    Returns:
+        Tuple[str, tuple]: Every allowed character, and the allowed characters and minimum count of each required kind
+    """
+    min_length, max_length, classes, minimums, banned = key
+    removed = {ord(character): None for character in banned}
+
+    alphabet = ''.join(CHARACTER_CLASSES[kind] for kind in classes).translate(removed)
+    if not alphabet:
+        raise ValueError("every character has been excluded, so no password can be made")
+
+    required = []
+    for kind, minimum in minimums:
+        characters = CHARACTER_CLASSES[kind].translate(removed)
+        if not characters:
+            raise ValueError(f"every character of kind {kind!r} is banned, but the policy requires {minimum}")
+        required.append((characters, minimum))
+
+    return alphabet, tuple(required)
+
+@functools.lru_cache(maxsize=256)
+def policy_for(exclusions: str = None, length: int = None) -> PasswordPolicy:
+    """Turns an exclusions string like "lp" or "lud !@#" into a policy, remembering the policies sites commonly use
+
+    Every kind of character that isn't excluded is required at least once, so the password is accepted on the first
+    try, unless the password is too short to hold one of each, when any allowed character can go anywhere instead.
+
+    Args:
+        exclusions (str, optional): Specifies any type of character not accepted in the password. Defaults to None.
+        length (int, optional): The length of the passwords the policy will make. Defaults to None for any length.
+
+    Returns:
+        PasswordPolicy: The policy for the exclusions
+    """
+    # If individual exclusions are specified, splitting off the exclusions so we can take them out
+    banned = ''
+    if exclusions is not None and ' ' in exclusions:
+        exclusions, banned = exclusions.split(' ', 1)
+        banned = banned.replace(' ', '')
+
+    classes = ''.join(kind for kind in CHARACTER_CLASSES if kind not in (exclusions or ''))
+
+    # only requiring the kinds that still have characters left after the banned ones are taken out
+    minimums = {kind: 1 for kind in classes if set(CHARACTER_CLASSES[kind]) - set(banned)}
+    if length is not None and length < len(minimums):
+        minimums = {}
+    return PasswordPolicy(classes=classes, minimums=minimums, banned=banned)
+
+@functools.lru_cache(maxsize=64)
+def _sampling_table(alphabet: str) -> Tuple[bytes, bytes]:
+    """Builds the byte tables that turn random bytes straight into password characters
+
+    Every random byte below the largest multiple of the alphabet size maps onto one character, so each character is
+    equally likely, and the bytes above it are thrown away instead of wrapping around and favouring the first few.
+
+    Args:
+        alphabet (str): The characters passwords are made of
+
+    Returns:
+        Tuple[bytes, bytes]: The translation table and the bytes to delete, for bytes.translate
+    """
+    characters = alphabet.encode('ascii')
+    limit = 256 - 256 % len(characters)
+    table = bytes(characters[value % len(characters)] if value < limit else 0 for value in range(256))
+    return table, bytes(range(limit, 256))
+
+def _random_characters(alphabet: str, count: int) -> str:
+    """Draws random characters from an alphabet, getting the randomness for many at a time
+
+    Args:
+        alphabet (str): The characters to choose from
+        count (int): How many characters to draw
+
+    Returns:
+        str: The cryptographically random characters
+    """
+    import secrets
+
+    table, rejected = _sampling_table(alphabet)
+    accept_rate = (256 - len(rejected)) / 256
+
+    # drawing random bytes in bulk and keeping only the unbiased ones until there are enough characters
+    characters = b''
+    while len(characters) < count:
+        missing = count - len(characters)
+        characters += secrets.token_bytes(int(missing / accept_rate * 1.05) + 16).translate(table, rejected)
+
+    return characters[:count].decode('ascii')
+
+def _generate_policy_batch(policy: PasswordPolicy, count: int, length: int) -> List[str]:
+    """Generates a batch of passwords that meet a policy in one pass, without making and throwing away any
+
+    The required characters are drawn from their own kinds and slotted in at random places among characters drawn
+    from the whole alphabet, which mixes them in as well as shuffling the whole password would.
+
+    Args:
+        policy (PasswordPolicy): The rules the passwords must meet
+        count (int): How many passwords to make
+        length (int): How long each password is
+
+    Returns:
+        List[str]: The cryptographically secure password strings
+    """
+    import secrets
+
+    alphabet, required = policy.compile()
+    extra = sum(minimum for characters, minimum in required)
+    free = length - extra
+
+    text = _random_characters(alphabet, count * free)
+    passwords = [text[start:start + free] for start in range(0, count * free, free)] if free else [''] * count
+    if not extra:
+        return passwords
+
+    # drawing every required character up front, then slotting each password's share into random places
+    drawn = [_random_characters(characters, count * minimum) for characters, minimum in required]
+    for number in range(count):
+        password = list(passwords[number])
+        for (characters, minimum), pool in zip(required, drawn):
+            for character in pool[number * minimum:(number + 1) * minimum]:
+                password.insert(secrets.randbelow(len(password) + 1), character)
+        passwords[number] = ''.join(password)
+
+    return passwords
+
+def new_passes(count: int, length=12, exclusions=None, processes: int = None) -> List[str]:
+    """Generates many cryptographically secure passwords at once, for bulk provisioning
+
+    Args:
+        count (int): How many passwords to make
+        length (int, optional): The required length of each password. Defaults to 12 characters long.
+        exclusions (str, optional): Specifies any type of character not accepted in the passwords. Defaults to None.
+        processes (int, optional): Spreads the work across this many processes. Defaults to None for this process only.
+
+    Returns:
+        List[str]: The cryptographically secure password strings
+    """
+    return policy_for(exclusions, length).generate_many(count, length, processes)
+
 def new_pass(length=12, exclusions=None) -> str:
     """Takes in a minimum length and an exclusions parameter that specifies
     anything not accepted by the website and returns a cryptographically
@@ -35,54 +1679,14 @@ def new_pass(length=12, exclusions=None) -> str:
     Returns:
         str: A cryptographically secure password string
     """
-    import secrets
-    import string
-    
-    # getting the available characters
-    lower: str = string.ascii_lowercase
-    upper: str = string.ascii_uppercase
-    digits: str = string.digits
-    punc: str = string.punctuation
-
-    # If individual exclusions are specified, splitting off the exclusions so we can take them out
-    if ' ' in exclusions:
-        exc = exclusions.split(' ')
-        exclusions = exc[0]
-        disallowed = exc[1]
-        print("Disallowed exclusions")
-    else:
-        disallowed = None
-
-    # making a dump for characters that will be chosen from 
-    using: str = ''
-
-    # dumping the data that we don't want to exclude into the dump string
-    if exclusions is not None:
-        if "l" not in exclusions:
-            using += lower
-        if "u" not in exclusions:
-            using += upper
-        if "d" not in exclusions:
-            using += digits
-        if "p" not in exclusions:
-            using += punc
-    elif exclusions is None:
-        using += lower
-        using += upper
-        using += digits
-        using += punc
-    
-    # taking away any manually defined exclusions with a raw string so as to avoid escaping characters or rogue backslashes
-    if disallowed is not None:
-        using = using.translate({ord(i): None for i in repr(disallowed)})
-        
-    # generating the cryptographically secure password string
-    password: str = ''.join(secrets.choice(using) for i in range(length))
-
-    return password
+    return policy_for(exclusions, length).generate(length)
 
+@pw_trace.traced('op.save_pass')
 def save_pass(site: str, username: str, password: str) -> None:
-    """A function that saves the username and generated password to the pickle file's dictionary with the key as the site name
+    """A function that saves the username and generated password as a record in the log with the key as the site name
+
+    A site can have any number of accounts, so saving a new username adds an account next to the ones already saved
+    and saving an existing username replaces that account's password.
 
     Args:
         site (str): The name of the website the user data belongs to
@@ -90,76 +1694,151 @@ def save_pass(site: str, username: str, password: str) -> None:
         password (str): The programmatically generated  and cryptographically secure password
     """
 
-    # opening the file to gather the old passwords
-    file = open(filename, 'rb')
+    # creating the key for the dictionary with the registrable domain of the website name
+    site_name = site_key(site)
 
-    # creating the key for the dictionary with the top level domain of the website name
-    site_split = site.split('.')
-    if len(site_split) == 3:
-        site_name = site_split[1]
-    elif len(site_split) == 2:
-        site_name = site_split[0]
-    elif len(site_split) >= 4:
-        site_name = site_split[2]
-    else:
-        site_name = site
+    # encrypting only this account's data and appending it, the rest of the vault is left alone
+    _commit_checked(lambda: _pack_record(site_name, username, {"site": site, "username": username, "password": password}))
 
-    # loading the pickled dictionary from the file and appending the new user data to it
-    try:
-        data = pickle.load(file)
-        passwords = decryption(data)
-    except EOFError:
-        passwords = {}
+def _iter_records():
+    """Decrypts the newest record for each account one at a time so the whole vault never has to be in memory
 
-    passwords[site_name] = {"site": site, "username": username, "password": password}
+    Yields:
+        Tuple[str, dict]: The standardized site key and the site, username and password saved for the account
+    """
+    # holding the shared lock until every record is read so a compaction can't move them
+    with vault_lock.shared():
+        index.refresh()
 
-    file.close()
-    repickle(passwords)
+        # going through the records in the order they were saved, so a vault rewritten from them keeps that order
+        with mapped_log() as view:
+            for offset, length in sorted(location for tag, location in index.items()):
+                site_data = decrypt_record(view[offset - RECORD_HEADER.size:offset + length].tobytes())
+                yield site_data.pop("key"), site_data
+
+def load_passwords() -> dict:
+    """Reads and decrypts the saved dictionary without writing anything back to disk
+
+    Returns:
+        dict: The decrypted site data keyed by standardized site name and username, or an empty dictionary if nothing has been saved yet
+    """
+    # only the newest record for every account is decrypted, superseded and deleted records are skipped
+    return {(site_name, site_data["username"]): site_data for site_name, site_data in _iter_records()}
+
+def _load_legacy_passwords() -> dict:
+    """Reads the dictionary saved in the old single pickle format so it can be moved to the record log
 
-def get_pass(site: str) -> Tuple[str, str, str]:
+    Returns:
+        dict: The decrypted dictionary of site data, or an empty dictionary if nothing had been saved
+    """
+    with open(filename, 'rb') as file:
+        data = load_legacy_pickle(file.read())
+    if data is None:
+        return {}
+
+    return decryption(data)
+
+@pw_trace.traced('op.get_pass')
+def get_pass(site: str, username: str = None) -> Tuple[str, str, str]:
     """Getter to retrieve user data for a given website
 
     Args:
         site (str): The name of the website thats data we want to retrieve
+        username (str, optional): The account to retrieve. Defaults to None for the account saved most recently.
 
     Returns:
         Tuple[str, str, str]: The website name, username, and password for the given website
     """
 
-    # opening the file and retrieving the dictionary with all the information
-    file = open(filename, 'rb')
-    data = pickle.load(file)
-    passwords = decryption(data)
-    repickle(passwords)
-
     # standardizing the website name to prepare for search
-    site_split = site.split('.')
-    if len(site_split) == 3:
-        site_name = site_split[1]
-    elif len(site_split) == 2:
-        site_name = site_split[0]
-    elif len(site_split) >= 4:
-        site_name = site_split[2]
-    else:
-        site_name = site
-    
-    # creating a new variable for the data from the specified website
-    site_data = passwords[site_name]
+    site_name = site_key(site)
+
+    # decrypting only the record for the specified account, lookups never rewrite the file
+    site_data = _find_record(site_name, username)
+    if site_data is None:
+        raise KeyError(site_name if username is None else f"{username} on {site_name}")
 
     # parsing the data from the dictionary into the specific parts to return
     site = site_data["site"]
     username = site_data["username"]
     password = site_data["password"]
 
-    file.close()
     return site, username, password
 
-def reset_pass(site: str, username: str) -> None:
+@pw_trace.traced('op.get_many')
+def get_many(sites) -> dict:
+    """Looks up many websites against one snapshot of the vault, only taking the lock and reading the index once
+
+    Args:
+        sites (Iterable): The names of the websites to look up, or (site, username) pairs for particular accounts
+
+    Returns:
+        dict: The website name, username, and password for each site asked for, or None for sites with no data
+    """
+    # reading every requested record while holding the shared lock once, then decrypting them after letting go
+    records: dict = {}
+    with vault_lock.shared():
+        index.refresh()
+        with pw_trace.span('log.read') as traced, mapped_log() as view:
+            for site in sites:
+                if isinstance(site, str):
+                    location = index.latest(session.tag(site_key(site)))
+                else:
+                    location = index.locate(session.tag(site_key(site[0]), site[1]))
+                if location is None:
+                    records[site] = None
+                else:
+                    offset, length = location
+                    records[site] = view[offset - RECORD_HEADER.size:offset + length].tobytes()
+                    traced.add_bytes(RECORD_HEADER.size + length)
+
+    results: dict = {}
+    for site, record in records.items():
+        if record is None:
+            results[site] = None
+        else:
+            site_data = decrypt_record(record)
+            results[site] = (site_data["site"], site_data["username"], site_data["password"])
+
+    return results
+
+@pw_trace.traced('op.list_accounts')
+def list_accounts(site: str, start: str = None, stop: str = None) -> List[Tuple[str, str, str]]:
+    """Gets every account saved on a website, or the accounts with usernames in a range
+
+    Args:
+        site (str): The name of the website whose accounts we want
+        start (str, optional): The first username to include. Defaults to None to start from the first one.
+        stop (str, optional): The username to stop before. Defaults to None to go to the last one.
+
+    Returns:
+        List[Tuple[str, str, str]]: The website name, username, and password of each account, sorted by username
+    """
+    site_name = site_key(site)
+
+    # finding every account on the site from the index and reading their records while holding the shared lock once
+    with vault_lock.shared():
+        index.refresh()
+        locations = sorted(index.accounts(session.tag(site_name)).values())
+        with mapped_log() as view:
+            records = [view[offset - RECORD_HEADER.size:offset + length].tobytes() for offset, length in locations]
+
+    accounts = []
+    for record in records:
+        site_data = decrypt_record(record)
+        username = site_data["username"]
+        if (start is None or username >= start) and (stop is None or username < stop):
+            accounts.append((site_data["site"], username, site_data["password"]))
+
+    return sorted(accounts, key=lambda account: account[1])
+
+def reset_pass(site: str, username: str, vault=None) -> None:
     """Adds functionality to set an already existing password from a different manager or reset a password in this one
 
     Args:
         site (str): The name of the website thats data we will be changing
         username (str): The provided username to be stored with the site data
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
     """
 
     # asking if the user would like to set a password or reset an existing password and then gathering the password accordingly
@@ -167,15 +1846,22 @@ def reset_pass(site: str, username: str) -> None:
     if manual_auto == "m":
         password: str = input("What would you like to set the password to? ")
     elif manual_auto == "a":
-        length: int = int(input("What is the required length of the password? "))
-        exclusions: str = input("Are there any types of characters you would like to exclude? ")
-        password: str = new_pass(length, exclusions)
+        # asking again until the length and exclusions leave something to make a password from
+        while True:
+            length: int = int(input("What is the required length of the password? "))
+            exclusions: str = input("Are there any types of characters you would like to exclude? ")
+            try:
+                password: str = new_pass(length, exclusions)
+                break
+            except ValueError as error:
+                print(f"Couldn't make a password with those settings: {error}")
     
     # saving the password to the database
-    save_pass(site, username, password)
+    (vault.save_pass if vault is not None else save_pass)(site, username, password)
 
     print("Your password has been set successfully")
 
+@pw_trace.traced('op.check_sites')
 def check_sites(site) -> Tuple[str, str]:
     """Checks to see if a saved password and username exists for the given website
 
@@ -183,107 +1869,584 @@ def check_sites(site) -> Tuple[str, str]:
         site (str): The user-given name of the website
 
     Returns:
-        Tuple[str, str]: Outputs either a 1 if data exists and a username, or a -1 if data does not exist
+        Tuple[str, str]: Outputs either a 1 if data exists and the username saved most recently, or a -1 if data does not exist
     """
 
-    # opening the file and importing the pickled data
-    file = open(filename, 'rb')
-    try:
-        data = pickle.load(file)
-        passwords = decryption(data)
-    except EOFError:
-        passwords = {}
-    
-    file.close()
-
-    # Resaving the encrypted data
-    repickle(passwords)
-
-    # extracting the website names from the dictionary
-    sites = dict.fromkeys(passwords)
-
     # standardizing the website name to prepare for search
-    site_split = site.split('.')
-    if len(site_split) == 3:
-        site_name = site_split[1]
-    elif len(site_split) == 2:
-        site_name = site_split[0]
-    elif len(site_split) >= 4:
-        site_name = site_split[2]
-    else:
-        site_name = site
+    site_name = site_key(site)
 
-    # searching for the site data and outputting
-    if site_name in sites:
-        site_data = passwords[site_name]
-        site = site_data["site"]
+    # searching the index for the site data and only decrypting it if it exists
+    site_data = _find_record(site_name)
+    if site_data is not None:
         user = site_data["username"]
-        password = site_data["password"]
         return 1, user
     else:
         return -1, None
 
-def delete_pass(site: str) -> None:
+@pw_trace.traced('op.delete_pass')
+def delete_pass(site: str, username: str = None) -> None:
     """Deleting user data for a given website
 
     Args:
         site (str): The name of the website whose data is to be deleted
+        username (str, optional): The account to delete. Defaults to None to delete every account on the site.
     """
-    # opening the file to gather the old passwords
-    file = open(filename, 'rb')
-
-    # creating the key for the dictionary with the top level domain of the website name
-    site_split = site.split('.')
-    if len(site_split) == 3:
-        site_name = site_split[1]
-    elif len(site_split) == 2:
-        site_name = site_split[0]
-    elif len(site_split) >= 4:
-        site_name = site_split[2]
-    else:
-        site_name = site
+    # creating the key for the dictionary with the registrable domain of the website name
+    site_name = site_key(site)
 
-    # loading the pickled dictionary from the file and deleting the selected site data
-    try:
-        data = pickle.load(file)
-        passwords = decryption(data)
-        del passwords[site_name]
-    except EOFError:
-        passwords = {}
+    # making sure the index has data for the account or site before appending deletion records for it, checking
+    # again if another process changed the vault in between
+    _commit_checked(lambda: _pack_deletions(site_name, username))
+
+def _pack_deletions(site_name: str, username: str = None) -> bytes:
+    """Makes the deletion records for one account, or for every account saved on a site
+
+    The caller should hold vault_lock with the index refreshed, since which accounts exist is read from it.
+
+    Args:
+        site_name (str): The standardized key the site's data is saved under
+        username (str, optional): The account to delete. Defaults to None for every account on the site.
+
+    Returns:
+        bytes: The deletion records
+    """
+    if username is not None:
+        if index.locate(session.tag(site_name, username)) is None:
+            raise KeyError(f"{username} on {site_name}")
+        return _pack_record(site_name, username)
+
+    # the account tags come straight from the index, so the usernames don't have to be decrypted to delete them
+    site_tag = session.tag(site_name)
+    accounts = index.accounts(site_tag)
+    if not accounts:
+        raise KeyError(site_name)
+    return b''.join(RECORD_HEADER.pack(site_tag, tag, 0) for tag in accounts)
+
+class VaultBatch:
+    """Collects many saves and deletions and writes them to the log together in one commit
+
+    Use it as a context manager so the changes are committed when the block finishes without an error:
+
+        with VaultBatch() as batch:
+            batch.save("example.com", "me", "hunter2")
+            batch.delete("old.example.com")
+    """
+    def __init__(self):
+        # the final state of every account changed in the batch by site name and username, in the order they were
+        # changed, None meaning the account is deleted and a username of None meaning every account on the site
+        self.pending: dict = {}
+
+        # the deletions that were checked against the saved data, which are checked again on commit
+        self._checked: set = set()
+
+    def save(self, site: str, username: str, password: str) -> None:
+        """Adds a save of user data for a website to the batch
+
+        Args:
+            site (str): The name of the website the user data belongs to
+            username (str): The entered username for the specified website
+            password (str): The password to save for the website
+        """
+        key = (site_key(site), username)
+        self.pending[key] = {"site": site, "username": username, "password": password}
+        self._checked.discard(key)
+
+    def delete(self, site: str, username: str = None) -> None:
+        """Adds a deletion of the user data for a website to the batch
+
+        Args:
+            site (str): The name of the website whose data is to be deleted
+            username (str, optional): The account to delete. Defaults to None to delete every account on the site.
+        """
+        site_name = site_key(site)
+        key = (site_name, username)
+
+        # taking back anything the batch was going to save for the account, or for the whole site
+        changed = [other for other in self.pending if other == key or (username is None and other[0] == site_name)]
+        saved = [other for other in changed if self.pending[other] is not None]
+        for other in changed:
+            del self.pending[other]
+            self._checked.discard(other)
+
+        # the account has to exist either earlier in this batch or in the saved data
+        if not saved:
+            if not self._exists(site_name, username):
+                raise KeyError(site_name if username is None else f"{username} on {site_name}")
+            self._checked.add(key)
+        self.pending[key] = None
+
+    def _exists(self, site_name: str, username: str = None) -> bool:
+        """Checks the saved data for an account or site without decrypting it
+
+        Args:
+            site_name (str): The standardized key the site's data is saved under
+            username (str, optional): The account to check for. Defaults to None for any account on the site.
+
+        Returns:
+            bool: True if the account or site has saved data
+        """
+        with vault_lock.shared():
+            index.refresh()
+            if username is None:
+                return bool(index.accounts(session.tag(site_name)))
+            return index.locate(session.tag(site_name, username)) is not None
+
+    def commit(self) -> int:
+        """Encrypts every changed account and appends all of the records with a single write
+
+        Returns:
+            int: The number of accounts or sites that were saved or deleted
+        """
+        # the saves are only encrypted again on a conflict if the keys changed, while the deletions are made again
+        # every time since which accounts they cover depends on the saved data
+        packed: dict = {}
+
+        def prepare() -> bytes:
+            rekeys = vault_lock.counters()[2]
+            if packed.get("rekeys") != rekeys:
+                packed["saves"] = {key: _pack_record(key[0], key[1], site_data) for key, site_data in self.pending.items() if site_data is not None}
+                packed["rekeys"] = rekeys
+
+            records = []
+            for key, site_data in self.pending.items():
+                if site_data is not None:
+                    records.append(packed["saves"][key])
+                    continue
+
+                # deletions checked against the saved data must still have something to delete, while accounts only
+                # saved earlier in this batch may have nothing on disk
+                try:
+                    records.append(_pack_deletions(*key))
+                except KeyError:
+                    if key in self._checked:
+                        raise KeyError(f"{key[0]} was deleted by another process first")
+            return b''.join(records)
+
+        if self.pending:
+            _commit_checked(prepare, durable=True)
+
+        changed = len(self.pending)
+        self.pending = {}
+        self._checked = set()
+        return changed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # only committing if the block finished, so a failed import leaves the vault as it was
+        if exc_type is None:
+            self.commit()
+        else:
+            self.pending = {}
+            self._checked = set()
+
+@pw_trace.traced('op.save_many')
+def save_many(entries, deletions=()) -> int:
+    """Saves and deletes the data for many websites in one commit instead of one write per site
+
+    Args:
+        entries (Iterable[Tuple[str, str, str]]): The site, username and password for each website to save
+        deletions (Iterable, optional): The names of websites whose accounts should all be deleted, or (site, username) pairs for single accounts. Defaults to ().
+
+    Returns:
+        int: The number of accounts or sites that were saved or deleted
+    """
+    # nothing is written until every entry has been added, so a bad entry leaves the vault as it was
+    batch = VaultBatch()
+    for site, username, password in entries:
+        batch.save(site, username, password)
+    for site in deletions:
+        if isinstance(site, str):
+            batch.delete(site)
+        else:
+            batch.delete(*site)
+
+    return batch.commit()
+
+# number of imported entries committed to the vault at a time
+IMPORT_BATCH_SIZE = 500
+
+# column names other password managers use in their exports, checked in order of preference
+SITE_FIELDS = ('url', 'login_uri', 'website', 'site', 'hostname', 'origin_url', 'name', 'title')
+USER_FIELDS = ('username', 'login_username', 'user', 'login', 'email', 'username_value')
+PASSWORD_FIELDS = ('password', 'login_password', 'pass', 'password_value')
+
+# the first line of an encrypted export made by this program
+EXPORT_FORMAT = 'pw_manager export'
+
+def _pick_field(entry: dict, fields: tuple) -> str:
+    """Gets the first non-empty value out of an imported entry for a set of possible column names
+
+    Args:
+        entry (dict): An imported row with lowercase keys
+        fields (tuple): The column names to check in order of preference
+
+    Returns:
+        str: The value found, or an empty string if none of the columns are present
+    """
+    for field in fields:
+        value = entry.get(field)
+        if value:
+            return str(value).strip()
+    return ''
+
+def _flatten_entry(entry: dict) -> dict:
+    """Lowercases an imported entry's keys and pulls up nested login data like Bitwarden's JSON export uses
+
+    Args:
+        entry (dict): An entry read from a CSV row or JSON object
+
+    Returns:
+        dict: The entry with lowercase keys and any login fields at the top level
+    """
+    flat = {str(key).strip().lower(): value for key, value in entry.items() if key is not None}
+
+    login = flat.get('login')
+    if isinstance(login, dict):
+        for key, value in login.items():
+            flat.setdefault(key.lower(), value)
+        uris = login.get('uris') or []
+        if uris and isinstance(uris[0], dict):
+            flat.setdefault('url', uris[0].get('uri'))
+
+    return flat
+
+def _import_entries(entries, batch_size: int = IMPORT_BATCH_SIZE, vault=None) -> int:
+    """Saves imported entries to the vault in batched commits, skipping entries without a site or password
+
+    Args:
+        entries (Iterable[dict]): The entries read from an export file
+        batch_size (int, optional): How many entries to commit at a time. Defaults to IMPORT_BATCH_SIZE.
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
+
+    Returns:
+        int: The number of entries that were saved
+    """
+    save = save_many if vault is None else vault.save_many
+    saved: int = 0
+    batch: list = []
+
+    for entry in entries:
+        entry = _flatten_entry(entry)
+        site = _pick_field(entry, SITE_FIELDS)
+        password = _pick_field(entry, PASSWORD_FIELDS)
+        if not site or not password:
+            continue
+
+        # keeping only the host name when the export has full links
+        if '://' in site:
+            site = host_name(site)
+        batch.append((site, _pick_field(entry, USER_FIELDS), password))
+
+        if len(batch) >= batch_size:
+            saved += save(batch)
+            batch = []
+
+    if batch:
+        saved += save(batch)
+    return saved
+
+def _iter_json(file, chunk_size: int = 65536):
+    """Streams the objects out of a JSON array or a JSON Lines file without reading the whole file into memory
+
+    A single object wrapping its entries in an "items" or "entries" list, like Bitwarden's export, has that list
+    streamed the same way, one entry at a time.
+
+    Args:
+        file (TextIO): The open export file
+        chunk_size (int, optional): How many characters to read at a time. Defaults to 65536.
+
+    Yields:
+        dict: Each object in the file
+    """
+    import json
+    from json.decoder import WHITESPACE
+
+    decoder = json.JSONDecoder()
+    buffer: str = ''
+    position: int = 0
+    finished: bool = False
+
+    def fill() -> bool:
+        # reading another chunk and dropping what has been decoded, so the buffer never holds much more than a chunk
+        nonlocal buffer, position, finished
+        if finished:
+            return False
+        chunk = file.read(chunk_size)
+        finished = chunk == ''
+        buffer = buffer[position:] + chunk
+        position = 0
+        return not finished
+
+    def peek() -> str:
+        # skipping whitespace to the next character, which is '' at the end of the file
+        nonlocal position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or not fill():
+                return buffer[position:position + 1]
+
+    def expect(characters: str) -> str:
+        # stepping over one of the punctuation characters that has to come next
+        nonlocal position
+        character = peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", buffer, position)
+        position += 1
+        return character
+
+    def value():
+        # decoding the next whole value from where we are, reading more of the file while it is cut off
+        nonlocal position
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # a number at the very end of the buffer may carry on in the next chunk
+            if end == len(buffer) and fill():
+                continue
+            position = end
+            return item
+
+    def elements():
+        # streaming the elements of an array whose opening bracket has been read
+        if peek() == ']':
+            expect(']')
+            return
+        while True:
+            yield value()
+            if expect(',]') == ']':
+                return
+
+    def members():
+        # going through an object whose opening brace has been read, streaming any list of entries it wraps, and
+        # returning the object itself if it didn't wrap one
+        fields: dict = {}
+        wrapped = False
+        if peek() == '}':
+            expect('}')
+            return fields
+        while True:
+            name = value()
+            expect(':')
+            if name in ('items', 'entries') and peek() == '[':
+                expect('[')
+                wrapped = True
+                yield from elements()
+            else:
+                fields[name] = value()
+            if expect(',}') == '}':
+                return None if wrapped else fields
+
+    # a file is one array, or one object or more, each on its own line in JSON Lines
+    while True:
+        character = peek()
+        if not character:
+            return
+        if character == '[':
+            expect('[')
+            yield from elements()
+        elif character == '{':
+            expect('{')
+            entry = yield from members()
+            if entry is not None:
+                yield entry
+        else:
+            yield value()
+
+def import_csv(file_path: str, batch_size: int = IMPORT_BATCH_SIZE, vault=None) -> int:
+    """Imports a CSV export from another password manager, reading it one row at a time
+
+    Args:
+        file_path (str): The path to the CSV file
+        batch_size (int, optional): How many entries to commit at a time. Defaults to IMPORT_BATCH_SIZE.
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
+
+    Returns:
+        int: The number of entries that were saved
+    """
+    import csv
+
+    with open(file_path, newline='', encoding='utf-8-sig') as file:
+        return _import_entries(csv.DictReader(file), batch_size, vault)
+
+def import_json(file_path: str, batch_size: int = IMPORT_BATCH_SIZE, vault=None) -> int:
+    """Imports a JSON or JSON Lines export from another password manager, reading it one object at a time
+
+    Args:
+        file_path (str): The path to the JSON file
+        batch_size (int, optional): How many entries to commit at a time. Defaults to IMPORT_BATCH_SIZE.
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
+
+    Returns:
+        int: The number of entries that were saved
+    """
+    with open(file_path, encoding='utf-8-sig') as file:
+        return _import_entries((item for item in _iter_json(file) if isinstance(item, dict)), batch_size, vault)
+
+def _export_fernet(passphrase: str, salt: bytes) -> 'Fernet':
+    """Derives the key for an encrypted export from a passphrase with scrypt
+
+    Args:
+        passphrase (str): The passphrase the export is protected with
+        salt (bytes): The random salt saved in the export's header
+
+    Returns:
+        Fernet: The symmetric cipher for the export's entries
+    """
+    from base64 import urlsafe_b64encode
+    from cryptography.fernet import Fernet
+
+    key = hashlib.scrypt(passphrase.encode('utf-8'), salt=salt, n=2**15, r=8, p=1, maxmem=2**26, dklen=32)
+    return Fernet(urlsafe_b64encode(key))
+
+@pw_trace.traced('op.export_vault')
+def export_vault(file_path: str, passphrase: str) -> int:
+    """Writes every saved site to an encrypted export file that can be moved to another machine
+
+    The export is protected by a passphrase instead of this machine's keys, and each site is encrypted on its
+    own line so the file can be written and read back one site at a time.
+
+    Args:
+        file_path (str): The path to write the export to
+        passphrase (str): The passphrase to protect the export with
+
+    Returns:
+        int: The number of sites exported
+    """
+    import json
+    import secrets
+    from base64 import b64encode
+
+    salt = secrets.token_bytes(16)
+    fer = _export_fernet(passphrase, salt)
 
-    repickle(passwords)
+    exported: int = 0
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({"format": EXPORT_FORMAT, "version": 1, "salt": b64encode(salt).decode('ascii')}) + '\n')
+        for site_name, site_data in _iter_records():
+            file.write(fer.encrypt(json.dumps(site_data).encode('utf-8')).decode('ascii') + '\n')
+            exported += 1
 
+    return exported
 
-def generate_keys(bytes: int) -> None:
+def import_vault(file_path: str, passphrase: str, batch_size: int = IMPORT_BATCH_SIZE, vault=None) -> int:
+    """Imports an encrypted export made by export_vault, reading it one site at a time
+
+    Args:
+        file_path (str): The path to the export file
+        passphrase (str): The passphrase the export was protected with
+        batch_size (int, optional): How many entries to commit at a time. Defaults to IMPORT_BATCH_SIZE.
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
+
+    Returns:
+        int: The number of entries that were saved
+    """
+    import json
+    from base64 import b64decode
+
+    with open(file_path, encoding='utf-8') as file:
+        header = json.loads(file.readline())
+        if header.get("format") != EXPORT_FORMAT:
+            raise ValueError(f"{file_path} is not an encrypted export from this program")
+        fer = _export_fernet(passphrase, b64decode(header["salt"]))
+
+        entries = (json.loads(fer.decrypt(line.strip().encode('ascii'))) for line in file if line.strip())
+        return _import_entries(entries, batch_size, vault)
+
+def export_csv(file_path: str) -> int:
+    """Writes every saved site to an unencrypted CSV file that other password managers can import
+
+    Args:
+        file_path (str): The path to write the CSV file to
+
+    Returns:
+        int: The number of sites exported
+    """
+    import csv
+
+    exported: int = 0
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        out = csv.writer(file)
+        out.writerow(['url', 'username', 'password'])
+        for site_name, site_data in _iter_records():
+            out.writerow([site_data["site"], site_data["username"], site_data["password"]])
+            exported += 1
+
+    return exported
+
+@pw_trace.traced('op.import_file')
+def import_file(file_path: str, passphrase: str = None, vault=None) -> int:
+    """Imports an export file, picking the importer from its extension
+
+    Args:
+        file_path (str): The path to a .csv, .json or .jsonl file from another manager, or an encrypted export
+        passphrase (str, optional): The passphrase for an encrypted export. Defaults to None.
+        vault (AgentClient, optional): A running agent to save through instead of this process. Defaults to None.
+
+    Returns:
+        int: The number of entries that were saved
+    """
+    extension = file_path.lower().rsplit('.', 1)[-1]
+    if extension == 'csv':
+        return import_csv(file_path, vault=vault)
+    elif extension in ('json', 'jsonl'):
+        return import_json(file_path, vault=vault)
+    else:
+        return import_vault(file_path, passphrase, vault=vault)
+
+def generate_keys(bytes: int = KEY_SIZE, backend: str = DEFAULT_KEY_WRAP, suffix: str = ''):
     """Generates public and private keys for asymmetric encryption and saves to respective files.
 
     Args:
-        bytes (int): the memory allocation, in bytes, for the generation of the keys
+        bytes (int, optional): the size, in bits, of the RSA keys to generate. Defaults to KEY_SIZE.
+        backend (str, optional): the name of the key wrapping backend to use. Defaults to DEFAULT_KEY_WRAP.
+        suffix (str, optional): added to the key file names to save a new generation beside the current one. Defaults to ''.
+
+    Returns:
+        bytes: the new symmetric key, for wrapping it in other ways as well
+
+    Raises:
+        FileExistsError: If there are saved passwords that only the current keys can read
     """
+    from os import path
 
-    # generating keys using RSA library
-    public_key, private_key = rsa.newkeys(bytes)
+    # refusing to put new keys in front of records the old keys were needed for, which would lose them for good
+    if _holds_records(record_log + suffix) or (suffix == '' and path.isfile(symmetric)):
+        raise FileExistsError(f"{record_log + suffix} holds saved passwords that new keys couldn't read, so no keys were made")
 
-    #saving files
-    with open(public, 'wb') as f:
-        f.write(public_key.save_pkcs1("PEM"))
-    
-        f.close()
-    
-    with open(private, 'wb') as f:
-        f.write(private_key.save_pkcs1("PEM"))
+    key_wrap = KEY_WRAP_BACKENDS[backend]
+
+    # generating keys using the selected backend
+    public_pem, private_pem = key_wrap.generate(bytes)
 
-        f.close()
+    from cryptography.fernet import Fernet
 
-    with open(symmetric, 'wb') as f:
-        fernet_key = Fernet.generate_key()
-        encrypted_key = rsa.encrypt(fernet_key, public_key)
-        pickle.dump(encrypted_key, f)
+    # saving the wrapped key first, so a vault file is never left wrapped for key files that were replaced
+    fernet_key = Fernet.generate_key()
+    write_wrapped_key(key_wrap.name, key_wrap.wrap(fernet_key, public_pem), record_log + suffix)
 
-        f.close()
+    #saving files
+    with atomic_open(public + suffix) as f:
+        f.write(public_pem)
+    
+    with atomic_open(private + suffix) as f:
+        f.write(private_pem)
+
+    # forgetting any key unwrapped from the old key files, here and in any other process
+    if suffix == '':
+        session.lock()
+        with vault_lock.exclusive():
+            vault_lock.bump(rekeyed=True)
+    return fernet_key
 
 def encryption(message: str) -> str:
-    """Gets the public key and uses it to encrypt the data for secure storage
+    """Uses the session's symmetric key to encrypt the data for secure storage
 
     Args:
         message (str): the data to be encrypted
@@ -294,36 +2457,18 @@ def encryption(message: str) -> str:
     # importing json to convert string to bytes array
     import json
 
-    # getting private asymmetric key to decrypt symmetric key
-    with open(private, 'rb') as f:
-        private_key = rsa.PrivateKey.load_pkcs1(f.read())
-
     # converting message to bytes array
     message_bytes: bytes = json.dumps(message).encode('utf-8')
 
-    # getting and unencrypting symmetric encryption key
-    with open(symmetric, 'rb') as key_file:
-        encrypted_key = pickle.load(key_file)
-        symmetric_key = rsa.decrypt(encrypted_key, private_key)
-    
-    # symmetrically encrypting message
-    fer = Fernet(symmetric_key)
-    encrypted: str = fer.encrypt(message_bytes)
-
-    # closing files to avoid memory leaks
-    f.close()
-    key_file.close()
-
-    # re-saving the encrypted symmetric key as pickle removes it from the file
-    with open(symmetric, 'wb') as f:
-        pickle.dump(encrypted_key, f)
-
-        f.close()
+    # symmetrically encrypting message with the already unwrapped key
+    fernet = session.fernet()
+    with pw_trace.span('fernet.encrypt', len(message_bytes)):
+        encrypted: str = fernet.encrypt(message_bytes)
 
     return encrypted
 
 def decryption(message: str) -> str:
-    """Gets the private key and uses it to decrypt the data for use
+    """Uses the session's symmetric key to decrypt the data for use
 
     Args:
         message (str): The encrypted data to be decrypted
@@ -334,31 +2479,14 @@ def decryption(message: str) -> str:
     # importing json to change from bytes array back to dictionary
     import json
 
-    # getting private asymmetric key to decrypt symmetric key
-    with open(private, 'rb') as f:
-        private_key = rsa.PrivateKey.load_pkcs1(f.read())
-    
-    # getting and unencrypting symmetric encryption key
-    with open(symmetric, 'rb') as key_file:
-        encrypted_key = pickle.load(key_file)
-        symmetric_key = rsa.decrypt(encrypted_key, private_key)
-    
-    # symmetrically decrypting message
-    fer = Fernet(symmetric_key)
-    unencrypted_bytes: bytes = fer.decrypt(message)
+    # symmetrically decrypting message with the already unwrapped key
+    fernet = session.fernet()
+    with pw_trace.span('fernet.decrypt', len(message)):
+        unencrypted_bytes: bytes = fernet.decrypt(message)
 
     # changing unencrypted bytes array to a dictionary
-    unencrypted = json.loads(unencrypted_bytes.decode('utf-8'))
-
-    # closing files to avoid memory leaks
-    f.close()
-    key_file.close()
-
-    # re-saving the encrypted symmetric key as pickle removes it from the file
-    with open(symmetric, 'wb') as f:
-        pickle.dump(encrypted_key, f)
-
-        f.close()
+    with pw_trace.span('json.parse', len(unencrypted_bytes)):
+        unencrypted = json.loads(unencrypted_bytes.decode('utf-8'))
 
     return unencrypted
 
@@ -371,58 +2499,294 @@ def initializer() -> None:
     path_ = path.join(curr_directory, "config")
     if not path.exists(path_):
         mkdir(path_)
-    # Creating a file if it doesn't exist
-    if not path.isfile(filename):
-        file = open(filename, 'x')
-        file.close()
 
-    if not path.isfile(public) or not path.isfile(private) or not path.isfile(symmetric):
-        generate_keys(1024)
+    # holding the exclusive lock so two processes starting at once don't both create keys or repair the log
+    with vault_lock.exclusive():
+        # finishing a key change that was interrupted before doing anything with the old keys
+        if path.isfile(rotation_journal):
+            newKeys()
+
+        # a new vault gets its keys here, which also creates the vault file to hold the wrapped key
+        if not path.isfile(public) or not path.isfile(private) or not (path.isfile(record_log) or path.isfile(symmetric)):
+            generate_keys(KEY_SIZE)
+
+        # moving data saved by an older version into the current vault layout, which rewrites it once
+        migrate_vault()
+
+        # cutting off a record that was only partly written when the program last stopped
+        index.refresh()
+        if path.getsize(record_log) > index.end:
+            with open(record_log, 'r+b') as file:
+                file.truncate(index.end)
+            vault_lock.bump(rewritten=True)
+            index.refresh()
+
+        # dropping old and deleted records once they outnumber the saved sites
+        if index.dead > max(len(index), 64):
+            compact_vault()
+        elif index.snapshot_due():
+            index.save_snapshot()
+
+@pw_trace.traced('op.migrate_vault')
+def migrate_vault() -> int:
+    """Moves a vault saved by an older version into the current layout, if it isn't in it already
+
+    Older versions kept everything in one pickle with the wrapped key pickled in symmetric.bin beside it. Every
+    account is decrypted once and written into a new vault file whose key-wrap section holds the same wrapped key, and
+    the old files are removed. The old pickles are only ever read as plain bytes.
+
+    Returns:
+        int: The number of accounts moved over, or None if the vault was already in the current layout
+    """
+    from os import path, remove
+
+    with vault_lock.exclusive():
+        if path.isfile(record_log):
+            data = None
+        elif path.isfile(filename):
+            data = {(site_key(site_data["site"]), site_data["username"]): site_data for site_data in _load_legacy_passwords().values()}
+        elif path.isfile(symmetric):
+            data = {}
+        else:
+            return None
+
+        if data is not None:
+            repickle(data)
+
+        # the wrapped key is in the vault file's key-wrap section now, so the old files are only in the way
+        for old_file in (filename, symmetric):
+            if path.isfile(old_file):
+                remove(old_file)
+        return None if data is None else len(data)
+
+# number of records re-encrypted between checkpoints while changing keys
+ROTATION_CHUNK = 256
+
+def _save_journal(journal: dict) -> None:
+    """Saves how far a key change has gotten so it can pick up from there after a crash
+
+    Args:
+        journal (dict): The phase of the key change, the records done and the length of the new log
+    """
+    import json
+
+    with atomic_open(rotation_journal, 'w') as file:
+        json.dump(journal, file)
 
-def newKeys() -> None:
+@pw_trace.traced('op.newKeys')
+def newKeys(progress=None, pin: str = None) -> None:
     """Function to reset the public and private keys in case of data breach
+
+    The records are re-encrypted a chunk at a time into a new generation of the log beside the old one, with a
+    checkpoint after each chunk, and the new keys and log only replace the old ones once every record is done.
+    If the program stops part way through, calling this again (or initializer) carries on from the last checkpoint.
+
+    Args:
+        progress (Callable[[int, int], None], optional): Called with the records done and the total after each chunk. Defaults to None.
+        pin (str, optional): The vault's PIN, which a vault with a PIN needs so the new key is wrapped with it too. Defaults to None.
     """
-    # opening passwords file and decrypting data
-    file = open(filename, 'rb')
-    data: bytes = pickle.load(file)
-    file.close()
-    passwords: dict = decryption(data)
+    import json
+    from os import path, replace, remove, fsync
+
+    # holding the exclusive lock throughout so no other process writes to the old log while it is copied
+    with vault_lock.exclusive():
+        new_log = record_log + '.new'
+        new_keys = KeySession(suffix='.new')
+
+        # starting a new key change, or picking up an interrupted one from its last checkpoint
+        if path.isfile(rotation_journal):
+            with open(rotation_journal) as file:
+                journal: dict = json.load(file)
+
+            # starting the copy over if anything was saved to or compacted in the old log since the last checkpoint,
+            # since the count of records done would no longer mark our place in it
+            if journal.get("generation") != vault_lock.generation() and path.isfile(new_log):
+                with mapped_log(new_log) as view:
+                    journal.update(phase="copying", done=0, end=_records_start(view, new_log), generation=vault_lock.generation())
+                _save_journal(journal)
+        else:
+            # checking the PIN first, since the new key has to be wrapped with it or the vault would lose its PIN
+            wrapped_pin = read_key_section().get(PIN_SCHEME)
+            if wrapped_pin is not None:
+                with open(private, 'rb') as f:
+                    private_pem = f.read()
+                if pin is None or unwrap_with_pin(wrapped_pin, pin, private_pem) is None:
+                    raise ValueError("the vault has a PIN, and the right PIN is needed to change its keys")
+
+            # making the new keys, which starts the new log with its key-wrap section
+            if path.isfile(new_log):
+                remove(new_log)
+            new_key = generate_keys(KEY_SIZE, suffix='.new')
+            if wrapped_pin is not None:
+                with open(private + '.new', 'rb') as f:
+                    new_private_pem = f.read()
+                write_wrapped_key(PIN_SCHEME, wrap_with_pin(new_key, pin, new_private_pem), new_log, keep_others=True)
+            with mapped_log(new_log) as view:
+                journal = {"phase": "copying", "done": 0, "end": _records_start(view, new_log),
+                           "generation": vault_lock.generation()}
+            _save_journal(journal)
+
+        if journal["phase"] == "copying":
+            # going through the records in the order they sit in the old log, so the count of records done marks our place
+            index.refresh()
+            locations = sorted(location for tag, location in index.items())
+            total = len(locations)
+
+            with mapped_log() as old_view, open(new_log, 'r+b') as new_file:
+                # dropping anything written after the last checkpoint
+                new_file.truncate(journal["end"])
+                new_file.seek(journal["end"])
+
+                for start in range(journal["done"], total, ROTATION_CHUNK):
+                    # re-encrypting one chunk of records with the new keys
+                    chunk = []
+                    for offset, length in locations[start:start + ROTATION_CHUNK]:
+                        site_data = decrypt_record(old_view[offset - RECORD_HEADER.size:offset + length].tobytes())
+                        del site_data["key"]
+                        chunk.append(_pack_record(site_key(site_data["site"]), site_data["username"], site_data, new_keys))
+
+                    # making sure the chunk is on disk before checkpointing it
+                    new_file.write(b''.join(chunk))
+                    new_file.flush()
+                    fsync(new_file.fileno())
+                    journal.update(done=min(start + ROTATION_CHUNK, total), end=new_file.tell())
+                    _save_journal(journal)
+
+                    if progress is not None:
+                        progress(journal["done"], total)
+
+            journal["phase"] = "swapping"
+            _save_journal(journal)
+
+        # moving the new generation into place, skipping any file an interrupted swap already moved
+        writer.sync()
+        for current in (record_log, private, public):
+            if path.isfile(current + '.new'):
+                replace(current + '.new', current)
+        _sync_directory(record_log)
+        remove(rotation_journal)
+        vault_lock.bump(rewritten=True, rekeyed=True)
+        index.refresh()
+        index.save_snapshot()
+
+        # forgetting both generations of unwrapped keys
+        new_keys.lock()
+        session.lock()
+
+        if progress is not None:
+            progress(journal["done"], journal["done"])
+
+def cancel_rotation() -> bool:
+    """Throws away a key change that was stopped before the new keys started replacing the old ones
+
+    A stopped key change would otherwise carry on the next time newKeys or initializer runs, which is only right
+    after a crash. Once the swap has started the old keys may already be gone, so that key change is left to finish.
 
-    # overwriting public, private, and symmetric keys
-    private_file = open(private, 'w').close()
-    public_file = open(public, 'w').close()
-    symmetric_file = open(symmetric, 'w').close()
-    generate_keys(1024)
+    Returns:
+        bool: True if a key change was thrown away
+    """
+    import json
+    from os import path, remove
+
+    with vault_lock.exclusive():
+        if not path.isfile(rotation_journal):
+            return False
+        with open(rotation_journal) as file:
+            if json.load(file)["phase"] != "copying":
+                return False
+
+        # removing the journal first, since new files left behind without it are simply replaced by the next key change
+        remove(rotation_journal)
+        for current in (record_log, private, public):
+            if path.isfile(current + '.new'):
+                remove(current + '.new')
+        return True
+
+@pw_trace.traced('op.set_pin')
+def set_pin(pin: str) -> None:
+    """Lets the vault be unlocked with a PIN, replacing any PIN it had, or stops it being unlocked with one
+
+    The PIN itself is never saved, only the symmetric key wrapped with a key scrypt derives from it and the private
+    key, so the vault file alone is no easier to open than without a PIN. Changing the key-wrap section moves every
+    record, so the log is rewritten once and the index is rebuilt.
 
-    # resaving data with new encryption keys
-    repickle(passwords)
+    Args:
+        pin (str): The new PIN, or None to remove the PIN
+    """
+    with vault_lock.exclusive():
+        wrapped = session.pin_wrap(pin)
+        writer.sync()
+        write_wrapped_key(PIN_SCHEME, wrapped, keep_others=True)
+        vault_lock.bump(rewritten=True)
+        index.refresh()
+        index.save_snapshot()
+
+def _pick_username(vault, site: str, allow_all: bool = False) -> str:
+    """Asks which account to use when a website has more than one saved
+
+    Args:
+        vault (module or AgentClient): Where the accounts are read from
+        site (str): The name of the website
+        allow_all (bool, optional): Lets the user answer "all" for every account. Defaults to False.
+
+    Returns:
+        str: The chosen username, or None if the site has at most one account or every account was chosen
+    """
+    accounts = vault.list_accounts(site)
+    if len(accounts) < 2:
+        return None
+
+    print(f"There are {len(accounts)} accounts saved for {site}:")
+    for number, account in enumerate(accounts, start=1):
+        print(f"{number}. {account[1]}")
+    choice = input(f"Which account? (1-{len(accounts)}{' or all' if allow_all else ''}) ")
+    if allow_all and choice == "all":
+        return None
+    return accounts[int(choice) - 1][1]
 
 def main() -> None:
-    import pyperclip
+    import sys
+    import pw_startup
 
     print("""Welcome to Password Manager, to proceed, you can type n to create a new password, l to load a 
         previously saved password, r to either set a password manually or reset an existing password,
-        or d to delete an existing password.""")
-    
+        d to delete an existing password, i to import passwords, or e to export passwords.""")
+
+    # asking before touching the vault, so the prompt only waits on importing this module
+    if pw_startup.ready("prompt"):
+        return
+    new_load: str = input("What would you like to do? (nlrdie) ")
+
+    # using the agent if one is running, since it already has the keys unwrapped and the vault indexed
+    from pw_agent import connect
+    agent = connect()
+    vault = agent if agent is not None else sys.modules[__name__]
+
     # making sure our files are initialized
-    initializer()
-    
-    new_load: str = input("What would you like to do? (nlrd) ")
+    if agent is None:
+        initializer()
 
     # if user selects to get a new password, saving it to database and copying it to clipboard
     if new_load == "n":
         print("Ready to generate new password")
-        length: int = int(input("What length is needed? "))
-        exclusions: str = input("Anything not allowed? ")
-        pw = new_pass(length, exclusions)
+        # asking again until the length and exclusions leave something to make a password from
+        while True:
+            length: int = int(input("What length is needed? "))
+            exclusions: str = input("Anything not allowed? ")
+            try:
+                pw = new_pass(length, exclusions)
+                break
+            except ValueError as error:
+                print(f"Couldn't make a password with those settings: {error}")
         site: str = input("What website is this for? ")
         user: str = input("What username did you use for this site? ")
 
         # Saving the password
-        save_pass(site, user, pw)
+        vault.save_pass(site, user, pw)
         print("Your password has been saved!")
 
         #Copying password to clipboard for use immediately
+        import pyperclip
         pyperclip.copy(pw)
         print("Password copied to clipboard")
 
@@ -430,13 +2794,10 @@ def main() -> None:
     elif new_load == "l":
         print("Ready to load existing password")
         site = input("What website? ")
-        site, user, pw = get_pass(site)
-        
-        #resaving password because pickle will delete it otherwise
-        save_pass(site, user, pw)
-        print("Your data has been successfully saved!")
+        site, user, pw = vault.get_pass(site, _pick_username(vault, site))
 
         print(user)
+        import pyperclip
         pyperclip.copy(pw)
         print("Password copied to clipboard")
 
@@ -444,31 +2805,68 @@ def main() -> None:
     elif new_load == "r":
         print("Ready to set existing password")
         site = input("What website? ")
-        exists, user = check_sites(site)
+        exists, user = vault.check_sites(site)
         if exists == -1:
             print("Website data not found")
             user = input("What username did you use for this site? ")
-        reset_pass(site, user)
+        else:
+            user = _pick_username(vault, site) or user
+        reset_pass(site, user, agent)
     
     # allows user to delete passwords that may no longer be in use
     elif new_load == "d":
         print("Ready to delete existing password")
         site = input("What website would you like to delete data for? ")
-        exists, user = check_sites(site)
+        exists, user = vault.check_sites(site)
         if exists == -1:
             print(f"Data does not exist for {site}")
         else:
+            username = _pick_username(vault, site, allow_all=True)
             y_n = input(f"Are you sure you want to delete data for {site}? (y/n) ")
             if y_n == "y":
-                delete_pass(site)
+                vault.delete_pass(site, username)
                 print(f"Data successfully deleted from {site}")
             else:
                 print(f"Did not delete data for {site}")
     
+    # allows user to bring in data exported from other password managers or from this one
+    elif new_load == "i":
+        print("Ready to import passwords")
+        file_path = input("What is the path to the export file? (.csv, .json, .jsonl, or .pwexport) ")
+        passphrase = None
+        if not file_path.lower().endswith(('.csv', '.json', '.jsonl')):
+            from getpass import getpass
+            passphrase = getpass("What passphrase was the export protected with? ")
+        imported = import_file(file_path, passphrase, agent)
+        print(f"{imported} passwords successfully imported")
+
+    # allows user to export their data to move it to another machine or password manager
+    elif new_load == "e":
+        # reading the vault in this process, which has to be ready for it even though the agent is running
+        if agent is not None:
+            initializer()
+        print("Ready to export passwords")
+        file_path = input("Where would you like to save the export? (.csv for other managers, .pwexport for this one) ")
+        if file_path.lower().endswith('.csv'):
+            exported = export_csv(file_path)
+            print("Warning: CSV exports are not encrypted, delete the file once you are done with it")
+        else:
+            from getpass import getpass
+            exported = export_vault(file_path, getpass("What passphrase would you like to protect the export with? "))
+        print(f"{exported} passwords successfully exported")
+
     # allows for the reset of encryption keys if the data has been compromised
     elif new_load == "new keys":
+        # the agent holds the keys being replaced, so it has to be stopped first
+        if agent is not None:
+            print("The password manager agent is running, stop it with \"python pw_agent.py stop\" before changing keys")
+            return
+        pin = None
+        if has_pin():
+            from getpass import getpass
+            pin = getpass("What is your PIN? ")
         print("Exchanging private and public keys")
-        newKeys()
+        newKeys(pin=pin)
         print("Passwords successfully resaved")
 
 if __name__ == "__main__":
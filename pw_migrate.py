@@ -0,0 +1,36 @@
+"""Moves a vault saved by an older version into the current binary vault format and reports what changed
+
+Run "python pw_migrate.py" from the folder with the config folder in it. The password manager also does this by
+itself the first time a newer version starts, this just does it up front. The passwords.pickle and symmetric.bin
+files older versions saved are only ever read as plain bytes, never loaded as arbitrary Python objects.
+"""
+from os import path
+import pw_manager
+
+def _size(file_paths) -> int:
+    """Adds up the size of whichever of the files exist
+
+    Args:
+        file_paths (Iterable[str]): The files to measure
+
+    Returns:
+        int: The total size in bytes
+    """
+    return sum(path.getsize(file_path) for file_path in file_paths if path.isfile(file_path))
+
+def main() -> None:
+    """Migrates the vault in the current folder, printing how many accounts were moved and the size before and after
+    """
+    vault_files = (pw_manager.filename, pw_manager.record_log, pw_manager.symmetric)
+    before = _size(vault_files)
+
+    migrated = pw_manager.migrate_vault()
+    if migrated is None:
+        print("Nothing to migrate, the vault is already in the current format or hasn't been made yet")
+        return
+
+    after = _size(vault_files)
+    print(f"Moved {migrated} accounts into {pw_manager.record_log}, {before} bytes before and {after} bytes after")
+
+if __name__ == '__main__':
+    main()
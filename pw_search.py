@@ -0,0 +1,364 @@
+"""Prefix and fuzzy search over the saved sites, for finding an entry without typing its exact name
+
+The search index holds the decrypted site names and usernames, so it only lives in memory while the vault is
+unlocked and is dropped whenever the key session locks. It catches up with the vault the same way the record index
+does, by only decrypting the records that changed since it was last brought up to date.
+"""
+from typing import List, Tuple
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+import bisect
+import heapq
+import threading
+import pw_manager
+
+# how many accounts a search returns unless asked for more
+SEARCH_LIMIT = 10
+
+# the share of a search's trigrams an account needs to have to count as a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+# how many of the accounts sharing the most trigrams with a search a fuzzy search will look at
+FUZZY_CANDIDATES = 500
+
+# the longest search that is also compared letter by letter with the start of each name, which catches swapped or
+# mistyped letters that break up too many trigrams, and how many names starting close to it that comparison reads
+EDIT_QUERY_LENGTH = 12
+EDIT_CANDIDATES = 100
+
+def _trigrams(term: str) -> set:
+    """Splits a search term into the overlapping three letter pieces used for fuzzy matching
+
+    Args:
+        term (str): The lowercase term
+
+    Returns:
+        set: Every three letter piece of the term
+    """
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+def _prefix_distance(query: str, term: str, limit: int) -> int:
+    """Counts the fewest letters to add, remove, change or swap with a neighbour to turn the query into the start of a term
+
+    Args:
+        query (str): The lowercase search
+        term (str): The lowercase term
+        limit (int): The most edits worth counting
+
+    Returns:
+        int: The number of edits, or limit + 1 if it takes more than limit
+    """
+    term = term[:len(query) + limit]
+    before: list = None
+    previous = list(range(len(term) + 1))
+    for i in range(1, len(query) + 1):
+        current = [i] + [0] * len(term)
+        for j in range(1, len(term) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (query[i - 1] != term[j - 1]))
+            if i > 1 and j > 1 and query[i - 1] == term[j - 2] and query[i - 2] == term[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current[j] = distance
+
+        # giving up as soon as every way of lining the two up already needs too many edits
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+
+    # the query only has to match the start of the term, so the best of the last row counts
+    return min(previous)
+
+class SearchIndex:
+    """A sorted prefix table and trigram index over the site names, original addresses and usernames of every account
+
+    The prefix table is the flattened form of a prefix trie, a sorted list of every term where all the terms below
+    a prefix sit next to each other, so a typeahead query is one binary search followed by reading the matches in
+    order. That gives trie lookups without a dictionary per letter, which would take far too much memory for a
+    large vault. The trigram index finds sites that are spelled close to the query when nothing starts with it.
+
+    Each account gets a number when it is indexed, and the trigram index keeps arrays of those numbers rather than
+    sets of accounts, so a large vault's index takes a few bytes per trigram. An account that changes is given a
+    new number and its old one is skipped until there are enough of those to be worth rebuilding the index.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._epoch = 0
+        self._indexed_epoch = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forgets every indexed site
+        """
+        self.entries: dict = {}
+        self._ids: dict = {}
+        self._accounts: list = []
+        self._terms: list = []
+        self._grams: dict = {}
+        self._tags: dict = {}
+        self._locations: dict = {}
+        self._generation: int = None
+
+    def clear(self) -> None:
+        """Drops everything the index decrypted, which is called whenever the key session locks
+
+        This doesn't wait on the index lock, because the key session may be locking from inside a sync. If another
+        thread is using the index, it drops everything itself when it lets go of the lock.
+        """
+        self._epoch += 1
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drop_if_cleared()
+            finally:
+                self._lock.release()
+
+    def _drop_if_cleared(self) -> None:
+        """Forgets every indexed site if the index was cleared since it was last used, which needs the lock held
+        """
+        if self._indexed_epoch != self._epoch:
+            self._indexed_epoch = self._epoch
+            self._reset()
+
+    @contextmanager
+    def _locked(self):
+        """Holds the index lock, dropping the index before and after if it was cleared meanwhile
+        """
+        with self._lock:
+            self._drop_if_cleared()
+            try:
+                yield
+            finally:
+                self._drop_if_cleared()
+
+    def sync(self) -> None:
+        """Brings the index up to date with the vault, only decrypting the records that changed since the last sync
+        """
+        with self._locked():
+            # unlocking first, since unlocking after an idle timeout clears the index
+            pw_manager.session.fernet()
+            self._drop_if_cleared()
+            epoch = self._epoch
+            if self._generation is not None and pw_manager.vault_lock.generation() == self._generation:
+                return
+
+            with pw_manager.vault_lock.shared():
+                pw_manager.index.refresh()
+                generation = pw_manager.vault_lock.generation()
+                live = dict(pw_manager.index.items())
+
+                # taking out the accounts that were deleted or changed
+                for tag in [tag for tag, location in self._locations.items() if live.get(tag) != location]:
+                    self._remove(self._tags.pop(tag))
+                    del self._locations[tag]
+
+                # decrypting and indexing the new versions one record at a time while the log can't change underneath
+                # us, sorting the prefix table once at the end when many accounts changed instead of inserting each
+                changed = [tag for tag in live if tag not in self._locations]
+                bulk = len(changed) > len(self._terms) // 8
+                with pw_manager.mapped_log() as view:
+                    for tag in changed:
+                        offset, length = live[tag]
+                        site_data = pw_manager.decrypt_record(view[offset - pw_manager.RECORD_HEADER.size:offset + length].tobytes())
+                        account = (site_data["key"], site_data["username"])
+                        self._tags[tag] = account
+                        self._locations[tag] = live[tag]
+                        self._add(account, site_data["site"], bulk)
+            if bulk:
+                self._terms.sort()
+
+            # numbering the accounts again once a quarter of the numbers belong to accounts that have changed
+            if len(self._accounts) - len(self.entries) > len(self.entries) // 4:
+                self._rebuild()
+            self._generation = generation
+
+            # the key session locked while we were decrypting, so none of this should be kept
+            if self._epoch != epoch:
+                self._reset()
+
+    def _add(self, account: tuple, site: str, bulk: bool = False) -> None:
+        """Indexes one account under its site's standardized name, original address and username
+
+        Args:
+            account (tuple): The standardized key the site's data is saved under and the account's username
+            site (str): The website name as the user gave it
+            bulk (bool, optional): Leaves the prefix table unsorted for the caller to sort once. Defaults to False.
+        """
+        site_name, username = account
+        number = len(self._accounts)
+        self._accounts.append(account)
+        self._ids[account] = number
+        self.entries[account] = (site, username)
+
+        grams: set = set()
+        for term in {site_name.lower(), site.lower(), username.lower()}:
+            if not term:
+                continue
+            if bulk:
+                self._terms.append((term, number))
+            else:
+                bisect.insort(self._terms, (term, number))
+            grams |= _trigrams(term)
+
+        # numbers only ever go up, so every posting stays sorted
+        for gram in grams:
+            posting = self._grams.get(gram)
+            if posting is None:
+                posting = self._grams[gram] = array('I')
+            posting.append(number)
+
+    def _remove(self, account: tuple) -> None:
+        """Takes one account back out of the index, leaving its number to be skipped until the next rebuild
+
+        Args:
+            account (tuple): The standardized key the site's data is saved under and the account's username
+        """
+        self._accounts[self._ids.pop(account)] = None
+        del self.entries[account]
+
+    def _rebuild(self) -> None:
+        """Indexes every account again under new numbers, dropping the numbers of accounts that changed
+        """
+        entries = self.entries
+        self.entries = {}
+        self._ids = {}
+        self._accounts = []
+        self._terms = []
+        self._grams = {}
+        for account, (site, username) in entries.items():
+            self._add(account, site, bulk=True)
+        self._terms.sort()
+
+    def _terms_of(self, account: tuple) -> set:
+        """Gets the lowercase terms an account is indexed under
+
+        Args:
+            account (tuple): The standardized key the site's data is saved under and the account's username
+
+        Returns:
+            set: The account's site name, address and username
+        """
+        site, username = self.entries[account]
+        return {term for term in (account[0].lower(), site.lower(), username.lower()) if term}
+
+    def prefix(self, query: str, limit: int = SEARCH_LIMIT) -> List[str]:
+        """Finds the accounts with a site name, address or username that starts with the query
+
+        Args:
+            query (str): What the user has typed so far
+            limit (int, optional): The most accounts to return. Defaults to SEARCH_LIMIT.
+
+        Returns:
+            List[tuple]: The site name and username of the matching accounts, in alphabetical order of the matching term
+        """
+        query = query.lower()
+        with self._locked():
+            terms = self._terms
+            accounts = self._accounts
+            found: list = []
+            position = bisect.bisect_left(terms, (query,))
+            while position < len(terms) and len(found) < limit:
+                term, number = terms[position]
+                if not term.startswith(query):
+                    break
+                account = accounts[number]
+                if account is not None and account not in found:
+                    found.append(account)
+                position += 1
+            return found
+
+    def fuzzy(self, query: str, limit: int = SEARCH_LIMIT) -> List[str]:
+        """Finds the accounts with a site name, address or username spelled close to the query
+
+        The accounts sharing the most trigrams with the query are looked at first. A short query is also compared
+        letter by letter with the start of those accounts' names and of the names starting with nearly the same
+        letters, so a swapped or mistyped letter that breaks up most of the trigrams still finds the site.
+
+        Args:
+            query (str): What the user has typed so far
+            limit (int, optional): The most accounts to return. Defaults to SEARCH_LIMIT.
+
+        Returns:
+            List[tuple]: The site name and username of the matching accounts, closest first
+        """
+        query = query.lower()
+        wanted = _trigrams(query)
+        if not wanted:
+            return []
+
+        with self._locked():
+            accounts = self._accounts
+
+            # counting the query's trigrams each account has, and keeping the accounts with the most, lowest number first
+            hits: Counter = Counter()
+            for gram in wanted:
+                hits.update(self._grams.get(gram, ()))
+            ranked = heapq.nsmallest(FUZZY_CANDIDATES, ((-count, number) for number, count in hits.items()
+                                                        if accounts[number] is not None))
+
+            # ranking close spellings by their number of edits and then the shortest name, ahead of the accounts that
+            # only share enough trigrams
+            scored: dict = {}
+            needed = len(wanted) * FUZZY_THRESHOLD
+            for count, number in ranked:
+                if -count >= needed:
+                    scored[number] = (1, count, 0, number)
+
+            if len(query) <= EDIT_QUERY_LENGTH:
+                most = 1 if len(query) < 7 else 2
+                numbers = [number for count, number in ranked[:EDIT_CANDIDATES]]
+
+                # the names starting with the query's first two letters, or with them swapped or one of them left out
+                for start in {query[:2], query[0] + query[2], query[1] + query[0], query[1:3]}:
+                    position = bisect.bisect_left(self._terms, (start,))
+                    for term, number in self._terms[position:position + EDIT_CANDIDATES]:
+                        if not term.startswith(start):
+                            break
+                        numbers.append(number)
+
+                for number in numbers:
+                    account = accounts[number]
+                    if account is None or number in scored and scored[number][0] == 0:
+                        continue
+                    edits, length = min((_prefix_distance(query, term, most), len(term)) for term in self._terms_of(account))
+                    if edits <= most:
+                        scored[number] = (0, edits, length, number)
+
+            return [accounts[key[-1]] for key in sorted(scored.values())[:limit]]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[Tuple[str, str]]:
+        """Finds the accounts matching the query, with ones that start with it first and close spellings after
+
+        Args:
+            query (str): What the user has typed so far
+            limit (int, optional): The most accounts to return. Defaults to SEARCH_LIMIT.
+
+        Returns:
+            List[Tuple[str, str]]: The website name and username of each matching account
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        with self._locked():
+            found = self.prefix(query, limit)
+            if len(found) < limit:
+                found += [account for account in self.fuzzy(query, limit) if account not in found][:limit - len(found)]
+
+            entries = self.entries
+            return [entries[account] for account in found if account in entries]
+
+# the search index shared by every search in this process, dropped whenever the keys are locked
+search_index = SearchIndex()
+pw_manager.session.on_lock.append(search_index.clear)
+
+def search(query: str, limit: int = SEARCH_LIMIT) -> List[Tuple[str, str]]:
+    """Finds the saved accounts matching what the user has typed so far
+
+    Args:
+        query (str): What the user has typed so far
+        limit (int, optional): The most accounts to return. Defaults to SEARCH_LIMIT.
+
+    Returns:
+        List[Tuple[str, str]]: The website name and username of each matching site
+    """
+    search_index.sync()
+    return search_index.search(query, limit)
@@ -0,0 +1,146 @@
+"""Times how long the password manager takes to put its window or its prompt in front of the user
+
+    PWM_STARTUP_REPORT=1 python pw_gui.py
+    python pw_startup.py gui
+    python pw_startup.py cli
+
+With PWM_STARTUP_REPORT set, the GUI and the command line print how long each step of starting took to stderr. Running
+this file starts one of them with Python's -X importtime as well, stops it as soon as it's ready for the user and
+prints those steps next to the imports that cost the most. Steps are measured from when the process was launched,
+to the nearest clock tick when the program is started directly, or from when this module was imported if the
+operating system doesn't say when the process started.
+"""
+import os
+import sys
+import time
+
+# the environment variables that turn the report on, stop the program once it's ready and say when it was launched
+REPORT_VARIABLE = 'PWM_STARTUP_REPORT'
+EXIT_VARIABLE = 'PWM_STARTUP_EXIT'
+LAUNCHED_VARIABLE = 'PWM_STARTUP_LAUNCHED'
+
+# the script started for each kind of startup that can be profiled
+TARGETS = {'gui': 'pw_gui.py', 'cli': 'pw_manager.py'}
+
+# how many of the most expensive imports the report lists
+SLOWEST_IMPORTS = 15
+
+# the prefix of the lines the steps are printed with, so the profiler can pick them out of everything else
+STEP_PREFIX = 'startup: '
+
+# whether to print the steps, read once so a step costs nothing more than this check when the report is off
+_reporting = bool(os.environ.get(REPORT_VARIABLE))
+_imported = time.time()
+_started: float = None
+
+def _launch_time() -> float:
+    """Finds when this process was launched, so a program started directly is timed from launch as well
+
+    Returns:
+        float: The launch time in seconds since the epoch
+    """
+    launched = os.environ.get(LAUNCHED_VARIABLE)
+    if launched:
+        return float(launched)
+    try:
+        # the start time in clock ticks since boot is the 22nd field of the process status, 20th after the name
+        with open('/proc/self/stat') as file:
+            ticks = int(file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as file:
+            uptime = float(file.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _imported
+
+def mark(step: str) -> None:
+    """Notes that startup got through a step, printing how long it took to get there when the report is on
+
+    Args:
+        step (str): What just finished, like "imports" or "vault opened"
+    """
+    global _started
+    if _reporting:
+        if _started is None:
+            _started = _launch_time()
+        print(f"{STEP_PREFIX}{step} {(time.time() - _started) * 1000:.1f}", file=sys.stderr, flush=True)
+
+def ready(step: str) -> bool:
+    """Notes that the program is ready for the user, the last step of starting
+
+    Args:
+        step (str): What the user now sees, like "window shown" or "prompt"
+
+    Returns:
+        bool: True if the program was only started to be timed and should stop here
+    """
+    mark(step)
+    return bool(os.environ.get(EXIT_VARIABLE))
+
+def _parse_imports(lines: list) -> list:
+    """Reads the timings -X importtime writes to stderr
+
+    Args:
+        lines (list): The lines of stderr
+
+    Returns:
+        list: The self and cumulative microseconds, nesting depth and name of each import
+    """
+    imports = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((int(own), int(cumulative), depth, name.strip()))
+    return imports
+
+def profile(target: str) -> int:
+    """Starts the GUI or the command line once, stopping it when it's ready, and prints where its startup time went
+
+    Args:
+        target (str): "gui" or "cli"
+
+    Returns:
+        int: The exit code for the process, which is non-zero if the program never got ready
+    """
+    import subprocess
+
+    # launching the program next to this file, but in the current folder so it finds the same config folder
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), TARGETS[target])
+    env = dict(os.environ, **{REPORT_VARIABLE: '1', EXIT_VARIABLE: '1', LAUNCHED_VARIABLE: repr(time.time())})
+    result = subprocess.run([sys.executable, '-X', 'importtime', script], env=env, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    lines = result.stderr.splitlines()
+
+    steps = [line[len(STEP_PREFIX):].rsplit(' ', 1) for line in lines if line.startswith(STEP_PREFIX)]
+    if not steps:
+        print(f"{TARGETS[target]} exited with {result.returncode} before it was ready:", file=sys.stderr)
+        print('\n'.join(line for line in lines if not line.startswith('import time:'))[-2000:], file=sys.stderr)
+        return 1
+
+    print(f"Startup of the {target}, from launch:")
+    width = max(len(step) for step, milliseconds in steps)
+    for step, milliseconds in steps:
+        print(f"  {step:<{width}} {float(milliseconds):9.1f} ms")
+
+    # the imports the program asked for itself, then the modules that spent the most time loading themselves
+    imports = _parse_imports(lines)
+    direct = sorted((item for item in imports if item[2] == 0), key=lambda item: -item[1])
+    print(f"\nTop level imports, {sum(item[1] for item in direct) / 1000:.1f} ms in total:")
+    for own, cumulative, depth, name in direct[:SLOWEST_IMPORTS]:
+        print(f"  {name:<40} {cumulative / 1000:9.1f} ms")
+
+    print("\nSlowest modules by their own import time:")
+    for own, cumulative, depth, name in sorted(imports, key=lambda item: -item[0])[:SLOWEST_IMPORTS]:
+        print(f"  {name:<40} {own / 1000:9.1f} ms")
+    return 0
+
+def main() -> None:
+    """Profiles the startup named on the command line
+    """
+    if len(sys.argv) != 2 or sys.argv[1] not in TARGETS:
+        sys.exit(f"usage: python {os.path.basename(__file__)} {'|'.join(TARGETS)}")
+    sys.exit(profile(sys.argv[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Records where the vault spends its time, as spans with a duration, a byte count and a call count
+
+    PWM_TRACE=trace.jsonl python pw_gui.py
+
+Setting PWM_TRACE to a file name writes every span to that file as one JSON line as it finishes, and prints a
+summary of each kind of span to stderr when the program exits. Code can also watch spans as they happen with
+add_hook, or read the totals so far with summary. Tracing is off unless one of those is in use, and then span()
+hands back one shared span that does nothing, so a traced block costs a function call and a flag check.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+
+# the environment variable naming the JSON lines file to trace to
+TRACE_VARIABLE = 'PWM_TRACE'
+
+# whether spans are being recorded, which is only read on the hot path and only changed under _lock
+enabled = False
+
+_lock = threading.Lock()
+_hooks: list = []
+_trace_file = None
+
+# the count, total nanoseconds, longest nanoseconds, bytes and failures of each kind of span
+_totals: dict = {}
+
+class _Span:
+    """One timed block, recorded when it ends
+
+    Args:
+        name (str): The kind of span, like "record.decrypt"
+        size (int): The bytes handled so far
+    """
+    __slots__ = ('name', 'bytes', '_start')
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.bytes = size
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _record(self.name, time.perf_counter_ns() - self._start, self.bytes, exc_type is not None)
+        return False
+
+    def add_bytes(self, size: int) -> None:
+        """Counts more bytes towards the span, for when the size is only known inside the block
+
+        Args:
+            size (int): The number of bytes
+        """
+        self.bytes += size
+
+class _NoSpan:
+    """The span handed out while tracing is off, which does nothing at all"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, size: int) -> None:
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def span(name: str, size: int = 0):
+    """Times a block as a span of the given kind when tracing is on
+
+    Args:
+        name (str): The kind of span, like "record.decrypt"
+        size (int, optional): The bytes the block handles, if already known. Defaults to 0.
+
+    Returns:
+        A context manager with an add_bytes method, shared and free while tracing is off
+    """
+    if not enabled:
+        return _NO_SPAN
+    return _Span(name, size)
+
+def traced(name: str):
+    """Makes every call of a function a span of the given kind, for timing whole vault operations
+
+    Args:
+        name (str): The kind of span, like "op.get_pass"
+
+    Returns:
+        Callable: The decorator
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Span(name, 0):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _record(name: str, duration: int, size: int, failed: bool) -> None:
+    """Adds a finished span to the totals and passes it on to the trace file and hooks
+
+    Args:
+        name (str): The kind of span
+        duration (int): How long it took in nanoseconds
+        size (int): The bytes it handled
+        failed (bool): Whether it ended with an exception
+    """
+    event = {"span": name, "ms": duration / 1e6, "bytes": size, "thread": threading.current_thread().name, "at": time.time()}
+    if failed:
+        event["error"] = True
+
+    with _lock:
+        totals = _totals.get(name)
+        if totals is None:
+            totals = _totals[name] = [0, 0, 0, 0, 0]
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] = max(totals[2], duration)
+        totals[3] += size
+        totals[4] += int(failed)
+
+        if _trace_file is not None:
+            import json
+            _trace_file.write(json.dumps(event) + '\n')
+        hooks = list(_hooks)
+
+    # calling the hooks outside the lock so a hook can start spans of its own, and reporting a hook that fails
+    # instead of letting it fail the vault operation being traced, which may be part way through a commit
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            import traceback
+            print(f"pw_trace: hook {hook!r} failed on a {name} span:", file=sys.stderr)
+            traceback.print_exc()
+
+def add_hook(hook) -> None:
+    """Calls a function with every span as it finishes, which turns tracing on
+
+    The event has the span's kind under "span", its duration in "ms", its "bytes", the "thread" it ran on, the
+    time it finished "at" in seconds since the epoch, and "error" if it raised. Hooks run on that same thread, so
+    they should be quick. An exception raised by a hook is printed to stderr and doesn't reach the traced code.
+
+    Args:
+        hook (Callable[[dict], None]): The function to call
+    """
+    global enabled
+
+    with _lock:
+        _hooks.append(hook)
+        enabled = True
+
+def remove_hook(hook) -> None:
+    """Stops calling a hook, turning tracing off if nothing else is using it
+
+    Args:
+        hook (Callable[[dict], None]): A function passed to add_hook
+    """
+    global enabled
+
+    with _lock:
+        _hooks.remove(hook)
+        enabled = bool(_hooks) or _trace_file is not None
+
+def summary() -> dict:
+    """Gets the totals for each kind of span recorded so far
+
+    Returns:
+        dict: The count, total, mean and longest milliseconds, bytes and errors for each kind of span
+    """
+    with _lock:
+        return {name: {"count": count, "total_ms": total / 1e6, "mean_ms": total / count / 1e6, "max_ms": longest / 1e6,
+                       "bytes": size, "errors": errors}
+                for name, (count, total, longest, size, errors) in sorted(_totals.items())}
+
+def reset() -> None:
+    """Forgets the totals recorded so far
+    """
+    with _lock:
+        _totals.clear()
+
+def _print_summary() -> None:
+    """Prints the totals as a table to stderr and closes the trace file, which runs when the program exits
+    """
+    global enabled, _trace_file
+
+    totals = summary()
+    if totals:
+        width = max(len(name) for name in totals)
+        print(f"{'span':<{width}} {'count':>8} {'total ms':>11} {'mean ms':>9} {'max ms':>9} {'bytes':>12}", file=sys.stderr)
+        for name, row in totals.items():
+            print(f"{name:<{width}} {row['count']:>8} {row['total_ms']:>11.2f} {row['mean_ms']:>9.3f} {row['max_ms']:>9.2f} {row['bytes']:>12}", file=sys.stderr)
+
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+        enabled = bool(_hooks)
+
+def _start_trace_file(trace_path: str) -> None:
+    """Starts writing spans to a JSON lines file and summarizing them at exit
+
+    Args:
+        trace_path (str): The file to append the spans to
+    """
+    import atexit
+    global enabled, _trace_file
+
+    with _lock:
+        _trace_file = open(trace_path, 'a', encoding='utf-8')
+        enabled = True
+    atexit.register(_print_summary)
+
+# tracing from the start when the environment asks for it
+if os.environ.get(TRACE_VARIABLE):
+    _start_trace_file(os.environ[TRACE_VARIABLE])
@@ -0,0 +1,29 @@
+"""Shared setup for the tests, which all work on one throwaway vault
+
+The vault's files are relative to the working folder and pw_manager keeps its keys, index and lock open for the life
+of the process, so the whole session runs in one temporary folder with one vault made up front.
+"""
+import os
+import sys
+import pytest
+
+# the modules live in the folder above, which pytest doesn't put on the path by itself
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session', autouse=True)
+def vault(tmp_path_factory):
+    """Makes a new vault in a temporary folder and runs every test from that folder
+
+    Yields:
+        module: pw_manager, with its vault created and unlocked
+    """
+    folder = tmp_path_factory.mktemp('vault')
+    old_folder = os.getcwd()
+    os.chdir(folder)
+    import pw_manager
+    pw_manager.initializer()
+    try:
+        yield pw_manager
+    finally:
+        pw_manager.writer.sync()
+        os.chdir(old_folder)
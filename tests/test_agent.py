@@ -0,0 +1,39 @@
+"""Tests for the agent that serves the unlocked vault over a local socket"""
+import threading
+import pytest
+import pw_agent
+
+@pytest.fixture
+def client(tmp_path):
+    """Serves the vault on a socket in a temporary folder and connects to it
+
+    Yields:
+        AgentClient: A client for the agent
+    """
+    socket_path = str(tmp_path / 'agent.sock')
+    server = pw_agent.AgentServer(socket_path, pw_agent.AgentHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = pw_agent.AgentClient(socket_path)
+    try:
+        yield client
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+def test_unknown_operation_is_an_agent_error(client):
+    with pytest.raises(pw_agent.AgentError, match="unknown operation 'get_passwords'"):
+        client.call('get_passwords', 'example.com')
+
+    # the connection is still usable afterwards
+    assert isinstance(client.call('ping'), int)
+
+def test_missing_site_is_a_key_error(client):
+    with pytest.raises(KeyError):
+        client.get_pass('never-saved.example')
+
+def test_operations_are_served(client):
+    client.save_pass('agent.example', 'me', 'secret')
+    assert client.get_pass('agent.example') == ('agent.example', 'me', 'secret')
@@ -0,0 +1,37 @@
+"""Tests for the asyncio interface to the vault"""
+import asyncio
+import time
+import pw_async
+
+def test_save_and_get():
+    async def main():
+        async with pw_async.AsyncVault() as vault:
+            await asyncio.gather(vault.save('async-a.example', 'me', 'one'), vault.save('async-b.example', 'you', 'two'))
+            return await asyncio.gather(vault.get('async-a.example'), vault.check('async-b.example'), vault.check('async-missing.example'))
+
+    assert asyncio.run(main()) == [('async-a.example', 'me', 'one'), (1, 'you'), (-1, None)]
+
+def test_close_does_not_block_the_event_loop():
+    async def main():
+        vault = pw_async.AsyncVault()
+        await vault.initialize()
+
+        # a slow job still running in the vault's threads when it is closed
+        slow = vault._executor.submit(time.sleep, 0.5)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        await vault.close()
+        ticking.cancel()
+        return slow.done(), ticks
+
+    finished, ticks = asyncio.run(main())
+    # close still waits for the threads, but the loop keeps running other tasks meanwhile
+    assert finished
+    assert ticks >= 10
@@ -0,0 +1,56 @@
+"""Tests for importing exports from other password managers"""
+import io
+import json
+import pw_manager
+
+class CountingReader(io.StringIO):
+    """A text file that counts how many characters have been read from it"""
+    read_count = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_count += len(data)
+        return data
+
+def _wrapped_export(count: int) -> str:
+    return json.dumps({
+        "encrypted": False,
+        "folders": [],
+        "items": [
+            {"name": f"site{number}", "login": {"username": f"user{number}", "password": f"pass{number}", "uris": [{"uri": f"https://site{number}.com/login"}]}}
+            for number in range(count)
+        ],
+    }, indent=2)
+
+def test_wrapped_items_are_streamed():
+    text = _wrapped_export(200)
+    file = CountingReader(text)
+    entries = pw_manager._iter_json(file, chunk_size=64)
+
+    # the first entry comes out after reading little more than a chunk past it, not the whole file
+    first = next(entries)
+    assert first["name"] == "site0"
+    assert file.read_count < text.index('"site1"') + 2 * 64
+
+    assert [entry["name"] for entry in entries] == [f"site{number}" for number in range(1, 200)]
+
+def test_wrapped_object_fields_are_skipped():
+    export = '{"folders": [{"id": 1}], "entries": [{"url": "a.com", "password": "x"}, {"url": "b.com", "password": "1.5e3"}], "version": 2}'
+    for chunk_size in (1, 3, 7, 65536):
+        assert list(pw_manager._iter_json(io.StringIO(export), chunk_size)) == [
+            {"url": "a.com", "password": "x"},
+            {"url": "b.com", "password": "1.5e3"},
+        ]
+
+def test_arrays_objects_and_json_lines():
+    assert list(pw_manager._iter_json(io.StringIO('[{"a": 1}, {"a": 22}]'), 2)) == [{"a": 1}, {"a": 22}]
+    assert list(pw_manager._iter_json(io.StringIO('{"a": 1}\n{"a": 2}\n'), 2)) == [{"a": 1}, {"a": 2}]
+    assert list(pw_manager._iter_json(io.StringIO('[]'), 2)) == []
+    assert list(pw_manager._iter_json(io.StringIO('{}'), 2)) == [{}]
+
+def test_import_json_saves_wrapped_entries(tmp_path):
+    export = tmp_path / 'export.json'
+    export.write_text(_wrapped_export(3), encoding='utf-8')
+
+    assert pw_manager.import_json(str(export), batch_size=2) == 3
+    assert pw_manager.get_pass('site1.com') == ('site1.com', 'user1', 'pass1')
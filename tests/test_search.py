@@ -0,0 +1,53 @@
+"""Tests for the prefix and fuzzy search over the saved sites"""
+import pytest
+import pw_manager
+import pw_search
+
+@pytest.fixture(scope='module', autouse=True)
+def sites():
+    """Saves a few sites spelled close to each other, and deletes them again after the tests
+    """
+    entries = [
+        ('site77.com', 'alice', 'one'),
+        ('site777.com', 'bob', 'two'),
+        ('site778.com', 'carol', 'three'),
+        ('https://login.gardening.net/start', 'dave', 'four'),
+    ]
+    pw_manager.save_many(entries)
+    yield entries
+    pw_manager.save_many([], [site for site, username, password in entries])
+
+def test_prefix_matches_in_alphabetical_order():
+    assert pw_search.search('site77', 3) == [('site77.com', 'alice'), ('site777.com', 'bob'), ('site778.com', 'carol')]
+
+def test_prefix_matches_usernames_and_addresses():
+    assert pw_search.search('caro') == [('site778.com', 'carol')]
+    assert pw_search.search('gardening') == [('https://login.gardening.net/start', 'dave')]
+    assert pw_search.search('https://login') == [('https://login.gardening.net/start', 'dave')]
+
+def test_swapped_letters_find_the_site():
+    found = pw_search.search('stie777')
+    assert found[0] == ('site777.com', 'bob')
+    assert ('site778.com', 'carol') in found
+
+def test_misspelling_finds_the_site():
+    assert pw_search.search('gardneing')[0] == ('https://login.gardening.net/start', 'dave')
+
+def test_results_are_deterministic():
+    fresh = pw_search.SearchIndex()
+    fresh.sync()
+    for query in ('stie777', 'site7', 'sit', 'gardneing'):
+        assert pw_search.search(query) == pw_search.search(query) == fresh.search(query)
+
+def test_deleted_accounts_are_not_found():
+    pw_manager.delete_pass('site778.com')
+    try:
+        assert ('site778.com', 'carol') not in pw_search.search('site77')
+        assert ('site778.com', 'carol') not in pw_search.search('stie778')
+    finally:
+        pw_manager.save_pass('site778.com', 'carol', 'three')
+    assert ('site778.com', 'carol') in pw_search.search('site778')
+
+def test_no_match():
+    assert pw_search.search('zzzzqqqq') == []
+    assert pw_search.search('   ') == []